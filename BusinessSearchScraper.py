@@ -1,109 +1,253 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from captcha_solver import CaptchaSolver, CaptchaSolverError
-from api_client import APIClient, SessionExpiredError
-from data_exporter import DataExporter
-
-MAX_REAUTH_ATTEMPTS = 3
-WORKERS = 3
-
-
-class BusinessSearchScraper:
-
-    def __init__(self, query, headless=True):
+import os
+from concurrent.futures import ThreadPoolExecutor
+from captcha_solver import CaptchaSolver
+from api_client import make_api_client, SessionExpiredError, AUTH_QUERY
+from data_exporter import DataExporter, normalize_results
+from page_journal import PageJournal
+from page_scheduler import PageScheduler, PageSource
+from session_manager import SessionManager
+from dedup_index import DedupIndex, DEDUP_INDEX_NAME
+from metrics import METRICS
+from incremental import IncrementalState, detect_ordering, page_is_ordered
+
+MAX_SESSION_RETRIES = 3
+PREFETCH_PAGES = 2  # pages after page 1 requested before totalPages is known
+
+
+class BusinessSearchScraper(PageSource):
+
+    def __init__(self, query, headless=True, async_mode=False, streaming=False,
+                 resume=False, persistent_browser=False, solver=None, api=None,
+                 sessions=None, output_dir="output", formats=(), delta=False,
+                 dedup_index=None, incremental=False, captcha_race=0, cache=False,
+                 reuse_session=True):
         self.query = query
-        self.solver = CaptchaSolver(headless=headless)
-        self.api = APIClient()
-        self.exporter = DataExporter(query)
-
-    def _authenticate(self):
-        token = self.solver.solve()
-        self.api.authenticate(token)
+        self.async_mode = async_mode
+        self.resume = resume
+        self.incremental = incremental
+        self.solver = solver or CaptchaSolver(headless=headless, persistent=persistent_browser,
+                                              race=captcha_race)
+        self.api = api or make_api_client(output_dir, cache, reuse_session)
+        self.sessions = sessions or SessionManager(self.solver, self.api)
+        if delta and dedup_index is None:
+            dedup_index = DedupIndex(os.path.join(output_dir, DEDUP_INDEX_NAME))
+        self.exporter = DataExporter(query, output_dir=output_dir, streaming=streaming,
+                                     formats=formats, dedup_index=dedup_index)
+        self.journal = PageJournal(query, output_dir=self.exporter.output_dir)
+        self.state = IncrementalState(query, output_dir=self.exporter.output_dir)
+        self.total_pages = None
+        self.total_results = None
+        self.ordering = None
+
+    def _authenticate(self, query=AUTH_QUERY):
+        return self.sessions.authenticate(query)
+
+    def _fetch_with_renewal(self, page):
+        for attempt in range(1, MAX_SESSION_RETRIES + 1):
+            try:
+                return self.api.fetch_page(self.query, page)
+            except SessionExpiredError as e:
+                if attempt == MAX_SESSION_RETRIES:
+                    raise
+                self.sessions.renew(e.session_id)
+
+    def _fetch_records(self, page):
+        return normalize_results(self._fetch_with_renewal(page).get('results', []))
+
+    def _fetch_first_pages(self, done_pages):
+        # Pages 2..k go out together with page 1 instead of waiting for
+        # totalPages. Pages that turn out to be past the end are dropped,
+        # and so is any error the server gave for them.
+        prefetch = []
+        if not self.incremental:
+            prefetch = [p for p in range(2, PREFETCH_PAGES + 2) if p not in done_pages]
+        with ThreadPoolExecutor(max_workers=len(prefetch) + 1) as pool:
+            first = pool.submit(self._fetch_with_renewal, 1)
+            futures = {page: pool.submit(self._fetch_records, page) for page in prefetch}
+
+        data = first.result()
+        total_pages = data.get('totalPages', 1)
+        prefetched = {}
+        for page, future in futures.items():
+            try:
+                prefetched[page] = future.result()
+            except Exception as e:
+                if page <= total_pages:
+                    print(f"[SCRAPER] Prefetch of '{self.query}' page {page} failed: {e}")
+        return data, prefetched
+
+    def _collect(self, page, records):
+        new_count = self.exporter.add_records(records)
+        self.journal.record_page(page, records)
+        self.state.observe(records)
+        print(f"[SCRAPER] '{self.query}' page {page}/{self.total_pages} — "
+              f"{new_count} new, {self.exporter.count} total")
+
+    def _restore_from_journal(self):
+        done_pages = set()
+        for page, records in self.journal.iter_pages():
+            self.exporter.add_records(records)
+            self.state.observe(records)
+            if page == 1:
+                self.ordering = detect_ordering(records)
+            done_pages.add(page)
+        if done_pages:
+            print(f"[SCRAPER] Resumed {len(done_pages)} completed pages "
+                  f"({self.exporter.count} records) from {self.journal.path}")
+        return done_pages
+
+    def _incremental_plan(self):
+        # Incremental scans are only safe if this query's results are sorted
+        # by a key we kept a high-water mark for, in the same direction as on
+        # the previous run.
+        state = self.state.load()
+        if state is None:
+            print(f"[SCRAPER] No previous state for '{self.query}'; doing a full scrape.")
+            return None
+        if self.ordering is None or state.get("ordering") != self.ordering:
+            print(f"[SCRAPER] Result ordering of '{self.query}' is {self.ordering or 'unsorted'} "
+                  f"(previously {state.get('ordering')}); incremental scan is not safe, "
+                  f"doing a full scrape.")
+            return None
+        field = self.ordering.split(":")[0]
+        high_water = self.state.high_water[field]
+        if high_water is None:
+            return None
+        return field, high_water
+
+    def _scan_incremental(self, plan, first_results, done_pages):
+        # Newest-first orderings put new records on the first pages, oldest-
+        # first orderings on the last ones. Probe from that end and stop at
+        # the first page that reaches records older than the high-water mark.
+        field, high_water = plan
+        descending = self.ordering.endswith(":desc")
+
+        def reaches_known(records):
+            return any(r.get(field) and r[field] <= high_water for r in records)
+
+        if descending:
+            if reaches_known(first_results):
+                pages = []
+            else:
+                pages = range(2, self.total_pages + 1)
+            edge = first_results[-1].get(field) if first_results else None
+        else:
+            pages = range(self.total_pages, 1, -1)
+            edge = None
+
+        probed = 0
+        for page in pages:
+            results = self._fetch_records(page)
+            if not page_is_ordered(results, self.ordering, edge):
+                print(f"[SCRAPER] Page {page} of '{self.query}' breaks the {self.ordering} "
+                      f"ordering; falling back to a full scrape.")
+                return [p for p in range(2, self.total_pages + 1) if p not in done_pages]
+
+            self._collect(page, results)
+            done_pages.add(page)
+            probed += 1
+            if results:
+                edge = results[-1].get(field) if descending else results[0].get(field)
+            if reaches_known(results):
+                break
 
-    def _fetch_and_collect(self, page):
-        data = self.api.fetch_page(self.query, page)
-        results = data.get('results', [])
-        return page, results
+        # Only now that the scan held is the previous output kept. Its
+        # records go in after the fetched ones, so a re-fetched record wins,
+        # and a fallback above scrapes fully without stale rows.
+        self.exporter.load_existing()
+        print(f"[SCRAPER] Incremental scan of '{self.query}' stopped after "
+              f"{probed + 1} of {self.total_pages} pages.")
+        return []
+
+    def prepare(self):
+        # Returns the pages still to fetch, or None if page 1 could not be
+        # fetched. Authenticates only if the shared client has no session.
+        if self.resume:
+            done_pages = self._restore_from_journal()
+            self.total_pages = self.journal.total_pages
+        else:
+            self.journal.reset()
+            done_pages = set()
+
+        if self.total_pages and done_pages >= set(range(1, self.total_pages + 1)):
+            print(f"[SCRAPER] All pages for '{self.query}' already completed in journal.")
+            return []
+
+        # Authenticating with the real query returns its page 1 as well. With
+        # a response cache, pages are looked up there first and the session
+        # is only set up once one misses.
+        auth_data = None
+        if not self.api.session_id and self.api.cache is None:
+            auth_data = self._authenticate(self.query if 1 not in done_pages else AUTH_QUERY)
+
+        # Page 1, with pages 2..k alongside it, discovers totalPages
+        if 1 not in done_pages:
+            prefetched = {}
+            if auth_data and 'results' in auth_data and 'totalPages' in auth_data:
+                data = auth_data
+            else:
+                try:
+                    data, prefetched = self._fetch_first_pages(done_pages)
+                except Exception as e:
+                    print(f"[SCRAPER] Fatal error fetching page 1 of '{self.query}': {e}")
+                    return None
+
+            results = normalize_results(data.get('results', []))
+            self.total_pages = data.get('totalPages', 1)
+            self.total_results = data.get('totalResults')
+            self.ordering = detect_ordering(results)
+            self.journal.total_pages = self.total_pages
+            print(f"[SCRAPER] Found {self.total_results} results across {self.total_pages} pages.")
+
+            plan = None
+            if self.incremental and not self.resume:
+                plan = self._incremental_plan()
+
+            self._collect(1, results)
+            done_pages.add(1)
+            for page in sorted(prefetched):
+                if page <= self.total_pages:
+                    self._collect(page, prefetched[page])
+                    done_pages.add(page)
+
+            if plan:
+                return self._scan_incremental(plan, results, done_pages)
+
+        return [p for p in range(2, self.total_pages + 1) if p not in done_pages]
+
+    def finish(self, complete):
+        if complete:
+            print(f"[SCRAPER] All pages for '{self.query}' scraped successfully.")
+        self.exporter.save()
+        self.exporter.verify_integrity()
+        if complete:
+            self.exporter.commit_delta()
+            self.journal.remove()
+            self.state.save(self.ordering, self.total_results, self.total_pages)
+        else:
+            self.journal.close()
+        return self.exporter.count
 
     def run(self):
         print(f"\n[SCRAPER] Starting scrape for query: '{self.query}'")
         print(f"{'='*50}")
 
-        self._authenticate()
-        reauth_count = 0
-
-        # Fetch page 1 first to discover totalPages
         try:
-            data = self.api.fetch_page(self.query, 1)
-        except Exception as e:
-            print(f"[SCRAPER] Fatal error fetching page 1: {e}")
-            self.exporter.save()
-            return len(self.exporter.results)
+            remaining = self.prepare()
+            if remaining is None:
+                self.exporter.save()
+                return self.exporter.count
 
-        total_pages = data.get('totalPages', 1)
-        total_results = data.get('totalResults', '?')
-        new_count = self.exporter.add_results(data.get('results', []))
-        print(f"[SCRAPER] Found {total_results} results across {total_pages} pages.")
-        print(f"[SCRAPER] Page 1/{total_pages} — "
-              f"{new_count} new, {len(self.exporter.results)} total")
-
-        if total_pages <= 1:
-            print("[SCRAPER] All pages scraped successfully.")
-            self.exporter.save()
-            self.exporter.verify_integrity()
-            return len(self.exporter.results)
-
-        # Fetch remaining pages concurrently
-        remaining = list(range(2, total_pages + 1))
-        current_workers = WORKERS
-
-        while remaining and reauth_count <= MAX_REAUTH_ATTEMPTS:
+            # Fetch remaining pages concurrently
             failed = []
-
-            with ThreadPoolExecutor(max_workers=current_workers) as pool:
-                futures = {
-                    pool.submit(self._fetch_and_collect, p): p
-                    for p in remaining
-                }
-
-                completed = {}
-                for future in as_completed(futures):
-                    page_num = futures[future]
-                    try:
-                        page_num, results = future.result()
-                        completed[page_num] = results
-                    except (SessionExpiredError, Exception) as e:
-                        if not isinstance(e, SessionExpiredError):
-                            print(f"[SCRAPER] Error on page {page_num}: {e}")
-                        failed.append(page_num)
-
-            for page_num in sorted(completed):
-                new_count = self.exporter.add_results(completed[page_num])
-                print(f"[SCRAPER] Page {page_num}/{total_pages} — "
-                      f"{new_count} new, {len(self.exporter.results)} total")
-
-            if not failed:
-                break
-
-            # Re-auth and retry failed pages with fewer workers
-            reauth_count += 1
-            if reauth_count > MAX_REAUTH_ATTEMPTS:
-                print("[SCRAPER] Max re-authentication attempts reached. Saving partial data.")
-                break
-
-            current_workers = max(1, current_workers - 1)
-            print(f"[SCRAPER] Session expired. Re-authenticating ({reauth_count}/{MAX_REAUTH_ATTEMPTS})... "
-                  f"Reducing workers to {current_workers}.")
-            try:
-                self._authenticate()
-                remaining = sorted(failed)
-            except CaptchaSolverError as e:
-                print(f"[SCRAPER] Re-authentication failed: {e}")
-                break
-        else:
-            if not remaining or not failed:
-                print("[SCRAPER] All pages scraped successfully.")
-
-        self.exporter.save()
-        self.exporter.verify_integrity()
-
-        return len(self.exporter.results)
+            if remaining:
+                scheduler = PageScheduler(self.api, self.sessions, self.async_mode)
+                failed = scheduler.run([(self, p) for p in remaining])
+        finally:
+            self.sessions.close()
+
+        if failed:
+            print(f"[SCRAPER] {len(failed)} pages missing; re-run with --resume to fetch them.")
+        count = self.finish(complete=not failed)
+        METRICS.write_report(self.exporter.output_dir, self.query)
+        return count
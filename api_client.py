@@ -1,6 +1,19 @@
-import time
-import random
+import os
+import json
+import asyncio
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from rate_limiter import RateLimiter, parse_retry_after
+from response_cache import ResponseCache, CACHE_NAME
+from session_store import SessionStore, STATE_DIR, SESSION_STORE_NAME
+from metrics import METRICS
+
+try:
+    # Decodes the raw body bytes directly, several times faster than json.
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 BASE_URL = "https://scraping-trial-test.vercel.app"
 API_URL = f"{BASE_URL}/api/search"
@@ -10,33 +23,74 @@ USER_AGENT = (
     "Chrome/134.0.0.0 Safari/537.36"
 )
 MAX_RETRIES = 3
-MIN_DELAY = 1.0
-MAX_DELAY = 3.0
+MAX_CONCURRENCY = 10
+HTTP2 = True
+AUTH_QUERY = "test"  # searched when the session is not for a specific query
 
 
 class SessionExpiredError(Exception):
-    pass
+
+    def __init__(self, message, session_id=None):
+        super().__init__(message)
+        self.session_id = session_id
+
+
+def make_api_client(output_dir, cache=False, reuse_session=True, state_dir=STATE_DIR,
+                    **kwargs):
+    # Every run writing to output_dir shares its response cache; the session
+    # store is kept in state_dir instead, away from the exports.
+    return APIClient(
+        cache=ResponseCache(os.path.join(output_dir, CACHE_NAME)) if cache else None,
+        session_store=(
+            SessionStore(os.path.join(state_dir, SESSION_STORE_NAME)) if reuse_session else None
+        ),
+        **kwargs,
+    )
 
 
 class APIClient:
 
-    def __init__(self):
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, http2=HTTP2, rate_limiter=None,
+                 base_url=BASE_URL, cache=None, session_store=None):
         self.session_id = None
+        self.cache = cache
+        self.session_store = session_store
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api/search"
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_concurrency = max_concurrency
+        self.http2 = http2
         self.headers = {
             'accept': '*/*',
             'accept-language': 'en-US,en;q=0.9',
-            'referer': f'{BASE_URL}/',
+            'referer': f'{base_url}/',
             'user-agent': USER_AGENT,
         }
 
-    def authenticate(self, recaptcha_token):
+        # One keep-alive pool shared by every worker thread, so pages reuse
+        # established TCP+TLS connections instead of handshaking per request.
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+        self._async_client = None
+        self._async_loop = None
+
+    def create_session(self, recaptcha_token, query=AUTH_QUERY):
+        # Exchanges a token for a new session without switching to it, so
+        # spare sessions can be prepared while workers use the current one.
+        # The exchange is itself a search, so passing the real query makes
+        # the response double as its page 1.
         print("[API] Authenticating with reCAPTCHA token...")
         auth_headers = self.headers.copy()
+        auth_headers.pop('x-search-session', None)
         auth_headers['x-recaptcha-token'] = recaptcha_token
 
-        response = requests.get(
-            API_URL,
-            params={'q': 'test', 'page': '1'},
+        self.rate_limiter.acquire()
+        response = self.http.get(
+            self.api_url,
+            params={'q': query, 'page': '1'},
             headers=auth_headers,
             timeout=15,
         )
@@ -46,59 +100,260 @@ class APIClient:
                 f"Authentication failed: HTTP {response.status_code} — {response.text}"
             )
 
-        data = response.json()
+        data = json_loads(response.content)
         session = data.get('session')
         if not session:
             raise Exception("Authentication response missing session ID")
 
-        self.session_id = session
-        self.headers['x-search-session'] = self.session_id
-        print(f"[API] Session established: {self.session_id}")
+        return session, data
+
+    def use_session(self, session_id, store=True):
+        self.session_id = session_id
+        self.headers['x-search-session'] = session_id
+        if store and self.session_store is not None:
+            self.session_store.save(self.base_url, session_id)
+        print(f"[API] Session established: {session_id}")
+
+    def restore_session(self, query=AUTH_QUERY):
+        # Reuses a session an earlier run left in the store if a probe search
+        # still succeeds. The probe searches the real query, so its response
+        # is returned as page 1.
+        if self.session_store is None:
+            return None
+        session = self.session_store.load(self.base_url)
+        if not session:
+            return None
+
+        headers = self.headers.copy()
+        headers['x-search-session'] = session
+        self.rate_limiter.acquire()
+        try:
+            response = self.http.get(
+                self.api_url,
+                params={'q': query, 'page': '1'},
+                headers=headers,
+                timeout=15,
+            )
+        except requests.RequestException:
+            return None
+
+        if response.status_code != 200:
+            if response.status_code == 403:
+                self.session_store.discard(self.base_url, session)
+            print(f"[API] Stored session rejected (HTTP {response.status_code}).")
+            return None
+
+        print("[API] Reusing stored session.")
+        self.use_session(session, store=False)
+        return json_loads(response.content)
+
+    def authenticate(self, recaptcha_token, query=AUTH_QUERY):
+        session, data = self.create_session(recaptcha_token, query)
+        self.use_session(session)
         return data
 
-    def fetch_page(self, query, page):
+    def _parse_response(self, response, page, attempt, session_id):
+        status = response.status_code
+        METRICS.inc("api_requests_total", status=status)
+        if status == 200:
+            self.rate_limiter.on_success()
+            return json_loads(response.content)
+
+        if status in (403, 429) or status >= 500:
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
+            self.rate_limiter.on_backoff(retry_after)
+
+        if status == 403:
+            if self.session_store is not None:
+                self.session_store.discard(self.base_url, session_id)
+            raise SessionExpiredError("Session expired (403)", session_id)
+
+        if status == 429 or status >= 500:
+            METRICS.inc("api_retries_total", reason=status)
+            print(f"[API] HTTP {status} on page {page}. Retry {attempt}/{MAX_RETRIES} "
+                  f"at {self.rate_limiter.rate:.2f} req/s...")
+            return None
+
+        raise Exception(
+            f"Unexpected HTTP {status}: {response.text}"
+        )
+
+    def _cache_lookup(self, query, page):
+        # Returns (cache key, cached entry, parsed data if the entry is fresh).
+        if self.cache is None:
+            return None, None, None
+        key = self.cache.key(self.api_url, query, page)
+        cached = self.cache.get(key)
+        if cached is not None and cached.fresh:
+            METRICS.inc("api_cache_total", outcome="hit")
+            return key, cached, json_loads(cached.body)
+        return key, cached, None
+
+    def _request_headers(self, cached):
+        headers = self.headers.copy()
+        if cached is not None:
+            if cached.etag:
+                headers['if-none-match'] = cached.etag
+            if cached.last_modified:
+                headers['if-modified-since'] = cached.last_modified
+        return headers
+
+    def _handle_response(self, response, page, attempt, session_id, key, cached):
+        if response.status_code == 304 and cached is not None:
+            METRICS.inc("api_requests_total", status=304)
+            METRICS.inc("api_cache_total", outcome="revalidated")
+            self.rate_limiter.on_success()
+            self.cache.refresh(key)
+            return json_loads(cached.body)
+
+        data = self._parse_response(response, page, attempt, session_id)
+        if data is not None and key is not None:
+            METRICS.inc("api_cache_total", outcome="miss")
+            self.cache.put(key, response.content, response.headers.get('etag'),
+                           response.headers.get('last-modified'))
+        return data
+
+    def _require_session(self):
+        # Raised as an expiry of session None, so callers that renew on 403
+        # authenticate on the first page the cache could not serve.
         if not self.session_id:
-            raise Exception("Not authenticated — call authenticate() first")
+            raise SessionExpiredError("Not authenticated — call authenticate() first")
 
+    def fetch_page(self, query, page):
+        key, cached, data = self._cache_lookup(query, page)
+        if data is not None:
+            return data
+        self._require_session()
         params = {'q': query, 'page': str(page)}
 
         for attempt in range(1, MAX_RETRIES + 1):
-            delay = random.uniform(MIN_DELAY, MAX_DELAY)
-            time.sleep(delay)
+            METRICS.observe("rate_limiter_wait_seconds", self.rate_limiter.acquire())
 
+            headers = self._request_headers(cached)
+            session_id = headers.get('x-search-session')
             try:
                 print(f"[API] Fetching page {page}...")
-                response = requests.get(
-                    API_URL,
-                    params=params,
-                    headers=self.headers,
-                    timeout=15,
-                )
-
-                if response.status_code == 200:
-                    return response.json()
-
-                if response.status_code == 403:
-                    raise SessionExpiredError("Session expired (403)")
-
-                if response.status_code >= 500:
-                    wait = 2 ** attempt
-                    print(f"[API] Server error {response.status_code}. "
-                          f"Retry {attempt}/{MAX_RETRIES} in {wait}s...")
-                    time.sleep(wait)
-                    continue
-
-                raise Exception(
-                    f"Unexpected HTTP {response.status_code}: {response.text}"
-                )
+                with METRICS.span("api_request_seconds"):
+                    response = self.http.get(
+                        self.api_url,
+                        params=params,
+                        headers=headers,
+                        timeout=15,
+                    )
+
+                data = self._handle_response(response, page, attempt, session_id,
+                                             key, cached)
+                if data is not None:
+                    return data
 
             except requests.RequestException as e:
+                self.rate_limiter.on_backoff()
+                METRICS.inc("api_retries_total", reason="network")
                 if attempt < MAX_RETRIES:
-                    wait = 2 ** attempt
                     print(f"[API] Network error: {e}. "
-                          f"Retry {attempt}/{MAX_RETRIES} in {wait}s...")
-                    time.sleep(wait)
+                          f"Retry {attempt}/{MAX_RETRIES}...")
                 else:
                     raise
 
         raise Exception(f"Failed to fetch page {page} after {MAX_RETRIES} retries")
+
+    def _get_async_client(self):
+        import httpx
+
+        # httpx clients are bound to the event loop they were created on.
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=15,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def fetch_page_async(self, query, page):
+        import httpx
+
+        key, cached, data = self._cache_lookup(query, page)
+        if data is not None:
+            return data
+        self._require_session()
+        client = self._get_async_client()
+        params = {'q': query, 'page': str(page)}
+
+        for attempt in range(1, MAX_RETRIES + 1):
+            METRICS.observe("rate_limiter_wait_seconds", await self.rate_limiter.acquire_async())
+
+            headers = self._request_headers(cached)
+            session_id = headers.get('x-search-session')
+            try:
+                print(f"[API] Fetching page {page}...")
+                with METRICS.span("api_request_seconds"):
+                    response = await client.get(
+                        self.api_url,
+                        params=params,
+                        headers=headers,
+                    )
+
+                data = self._handle_response(response, page, attempt, session_id,
+                                             key, cached)
+                if data is not None:
+                    return data
+
+            except httpx.TransportError as e:
+                self.rate_limiter.on_backoff()
+                METRICS.inc("api_retries_total", reason="network")
+                if attempt < MAX_RETRIES:
+                    print(f"[API] Network error: {e}. "
+                          f"Retry {attempt}/{MAX_RETRIES}...")
+                else:
+                    raise
+
+        raise Exception(f"Failed to fetch page {page} after {MAX_RETRIES} retries")
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+
+class AsyncExecutor:
+    # Drop-in for ThreadPoolExecutor: coroutines run on one background event
+    # loop and submit() hands back concurrent futures for as_completed().
+
+    def __init__(self, api, max_workers=MAX_CONCURRENCY):
+        self.api = api
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._max_workers = max_workers
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    async def _bounded(self, fn, args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_workers)
+        async with self._semaphore:
+            return await fn(*args)
+
+    def submit(self, fn, *args):
+        return asyncio.run_coroutine_threadsafe(self._bounded(fn, args), self._loop)
+
+    def shutdown(self, wait=True):
+        future = asyncio.run_coroutine_threadsafe(self.api.aclose(), self._loop)
+        if wait:
+            future.result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if wait:
+            self._thread.join()
+            self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=True)
+        return False
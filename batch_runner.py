@@ -0,0 +1,102 @@
+import os
+import sys
+from captcha_solver import CaptchaSolver
+from api_client import make_api_client
+from page_scheduler import PageScheduler
+from session_manager import SessionManager
+from dedup_index import DedupIndex, DEDUP_INDEX_NAME
+from metrics import METRICS
+from BusinessSearchScraper import BusinessSearchScraper
+
+MAX_ACTIVE_QUERIES = 32  # queries with open journals and export files at once
+
+
+def read_queries(source):
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+    queries = []
+    for line in lines:
+        query = line.strip()
+        if query and not query.startswith("#") and query not in queries:
+            queries.append(query)
+    return queries
+
+
+class BatchRunner:
+
+    def __init__(self, queries, headless=True, async_mode=False, streaming=False,
+                 resume=False, persistent_browser=False, output_dir="output", formats=(),
+                 delta=False, incremental=False, captcha_race=0, cache=False,
+                 reuse_session=True, max_active=MAX_ACTIVE_QUERIES):
+        self.queries = queries
+        self.output_dir = output_dir
+        self.async_mode = async_mode
+        self.max_active = max_active
+        self.scraper_options = dict(
+            async_mode=async_mode, streaming=streaming, resume=resume,
+            output_dir=output_dir, formats=formats, incremental=incremental,
+        )
+        self.solver = CaptchaSolver(headless=headless, persistent=persistent_browser,
+                                    race=captcha_race)
+        self.api = make_api_client(output_dir, cache, reuse_session)
+        self.sessions = SessionManager(self.solver, self.api)
+        # One index for the whole batch, so overlapping queries don't export
+        # the same record twice.
+        self.dedup_index = (
+            DedupIndex(os.path.join(output_dir, DEDUP_INDEX_NAME)) if delta else None
+        )
+        # Scrapers of the wave in progress, for saving partial results when
+        # the run is interrupted.
+        self.active_scrapers = []
+
+    def _make_scraper(self, query):
+        return BusinessSearchScraper(
+            query, solver=self.solver, api=self.api, sessions=self.sessions,
+            dedup_index=self.dedup_index, **self.scraper_options,
+        )
+
+    def _run_wave(self, queries, counts, incomplete):
+        # Scrapers are built per wave: each holds a journal and, when
+        # streaming, its export files open until finish().
+        scrapers = [self._make_scraper(query) for query in queries]
+        self.active_scrapers = scrapers
+        jobs = []
+        for scraper in scrapers:
+            remaining = scraper.prepare()
+            if remaining is None:
+                incomplete.add(scraper.query)
+                continue
+            jobs.extend((scraper, page) for page in remaining)
+
+        if jobs:
+            print(f"[BATCH] Dispatching {len(jobs)} pages across "
+                  f"{len({scraper for scraper, _ in jobs})} queries.")
+            scheduler = PageScheduler(self.api, self.sessions, self.async_mode)
+            for scraper, _ in scheduler.run(jobs):
+                incomplete.add(scraper.query)
+
+        for scraper in scrapers:
+            counts[scraper.query] = scraper.finish(complete=scraper.query not in incomplete)
+        self.active_scrapers = []
+
+    def run(self):
+        print(f"\n[BATCH] Starting batch of {len(self.queries)} queries")
+        print(f"{'='*50}")
+
+        counts = {}
+        incomplete = set()
+        try:
+            for i in range(0, len(self.queries), self.max_active):
+                self._run_wave(self.queries[i:i + self.max_active], counts, incomplete)
+        finally:
+            self.sessions.close()
+
+        if incomplete:
+            print(f"[BATCH] {len(incomplete)} queries incomplete; "
+                  f"re-run with --resume to fetch the missing pages.")
+        METRICS.write_report(self.output_dir, "batch")
+        return counts
@@ -0,0 +1,243 @@
+import json
+import time
+import uuid
+import hashlib
+import random
+import argparse
+import threading
+import multiprocessing
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESULTS_PER_PAGE = 10
+STATUSES = ["Active", "Pending", "Inactive", "Dissolved"]
+FIRST_NAMES = ["John", "Jen", "Sara", "Mike", "Ana", "Li", "Omar", "Kate"]
+STREETS = ["Maple Ave", "Hill Ave", "Elm Ave", "Oak St", "Pine Rd", "Lake Dr"]
+WORDS = ["Apex", "Green", "Silver", "Blue", "Nova", "Prime", "Summit", "Core"]
+SUFFIXES = ["Works LLC", "Labs LLC", "Tech CORP", "Group INC", "Partners LLC"]
+
+
+class MockConfig:
+
+    def __init__(self, total_pages=10, latency_ms=20.0, jitter_ms=5.0,
+                 error_rate=0.0, expire_after=0, duplicate_rate=0.0, seed=0):
+        self.total_pages = total_pages
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate          # fraction of page requests answered 5xx
+        self.expire_after = expire_after      # requests per session before 403 (0 = never)
+        self.duplicate_rate = duplicate_rate  # fraction of records repeated from the previous page
+        self.seed = seed
+
+
+def make_record(index):
+    # Deterministic per registration number, so every run sees the same data.
+    rng = random.Random(index)
+    first = rng.choice(FIRST_NAMES)
+    return {
+        "businessName": f"{rng.choice(WORDS)} {rng.choice(SUFFIXES)}",
+        "registrationId": f"SD{index:07d}",
+        "status": rng.choice(STATUSES),
+        "filingDate": f"{rng.randint(1990, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "agent": {
+            "name": f"{first} Smith",
+            "address": f"{rng.randint(100, 9999)} {rng.choice(STREETS)}",
+            "email": f"{first.lower()}.smith.{uuid.UUID(int=rng.getrandbits(128))}@example.com",
+        },
+    }
+
+
+def make_page(config, query, page):
+    start = (page - 1) * RESULTS_PER_PAGE + 1
+    results = [make_record(i) for i in range(start, start + RESULTS_PER_PAGE)]
+
+    rng = random.Random(f"{config.seed}:{query}:{page}")
+    if page > 1:
+        for i in range(RESULTS_PER_PAGE):
+            if rng.random() < config.duplicate_rate:
+                results[i] = make_record(start - RESULTS_PER_PAGE + i)
+
+    return {
+        "results": results if page <= config.total_pages else [],
+        "totalPages": config.total_pages,
+        "totalResults": config.total_pages * RESULTS_PER_PAGE,
+        "page": page,
+    }
+
+
+class MockSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        config = server.config
+        url = urlparse(self.path)
+        if url.path != "/api/search":
+            self._send_json(404, {"error": "Not found"})
+            return
+
+        params = parse_qs(url.query)
+        query = params.get("q", [""])[0]
+        try:
+            page = int(params.get("page", ["1"])[0])
+        except ValueError:
+            self._send_json(400, {"error": "Invalid page"})
+            return
+
+        delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+        time.sleep(delay)
+        server.count_request()
+
+        token = self.headers.get("x-recaptcha-token")
+        if token:
+            session = server.new_session()
+            payload = make_page(config, query, page)
+            payload["session"] = session
+            self._send_json(200, payload)
+            return
+
+        session = self.headers.get("x-search-session")
+        if not server.use_session(session):
+            self._send_json(403, {"error": "Session expired"})
+            return
+
+        if random.random() < config.error_rate:
+            self._send_json(503, {"error": "Injected failure"}, {"Retry-After": "0"})
+            return
+
+        # Pages are deterministic, so a body hash doubles as the ETag.
+        payload = make_page(config, query, page)
+        digest = hashlib.blake2b(json.dumps(payload).encode("utf-8"), digest_size=8)
+        etag = f'"{digest.hexdigest()}"'
+        if self.headers.get("if-none-match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._send_json(200, payload, {"ETag": etag})
+
+
+class MockSearchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockSearchHandler)
+        self.config = config
+        self.requests_served = 0
+        self.sessions_issued = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests_served += 1
+
+    def new_session(self):
+        session = str(uuid.uuid4())
+        with self._lock:
+            self._sessions[session] = 0
+            self.sessions_issued += 1
+        return session
+
+    def use_session(self, session):
+        with self._lock:
+            if session not in self._sessions:
+                return False
+            self._sessions[session] += 1
+            if self.config.expire_after and self._sessions[session] > self.config.expire_after:
+                del self._sessions[session]
+                return False
+            return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _serve_in_child(config, conn):
+    server = MockSearchServer(config).start()
+    conn.send(server.base_url)
+    conn.recv()  # stop request
+    server.stop()
+    conn.send((server.requests_served, server.sessions_issued))
+    conn.close()
+
+
+class MockServerProcess:
+    # Runs MockSearchServer in its own process, so a benchmark's peak RSS and
+    # GIL time belong to the scraper alone. Counters are read back on stop().
+
+    def __init__(self, config):
+        self.config = config
+        self.base_url = None
+        self.requests_served = 0
+        self.sessions_issued = 0
+        self._conn = None
+        self._process = None
+
+    def start(self):
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve_in_child, args=(self.config, child_conn), daemon=True
+        )
+        self._process.start()
+        self.base_url = self._conn.recv()
+        return self
+
+    def stop(self):
+        self._conn.send("stop")
+        self.requests_served, self.sessions_issued = self._conn.recv()
+        self._conn.close()
+        self._process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for /api/search")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--expire-after", type=int, default=0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        total_pages=args.pages, latency_ms=args.latency_ms, error_rate=args.error_rate,
+        expire_after=args.expire_after, duplicate_rate=args.duplicate_rate,
+    )
+    server = MockSearchServer(config, port=args.port)
+    print(f"[MOCK] Serving /api/search on {server.base_url} ({args.pages} pages)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import page_scheduler
+from api_client import APIClient
+from rate_limiter import RateLimiter
+from BusinessSearchScraper import BusinessSearchScraper
+from mock_server import MockConfig, MockServerProcess
+
+DEFAULT_SIZES = "10,1000,100000"
+BENCHMARK_QUERY = "bench"
+
+
+class StubSolver:
+    max_solve_seconds = 1
+
+    def solve(self):
+        return "benchmark-token"
+
+    def close(self):
+        pass
+
+
+class TimedScraper(BusinessSearchScraper):
+    # Records wall time per page fetch (including client-side retries).
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def _fetch_and_collect(self, page):
+        start = time.perf_counter()
+        try:
+            return super()._fetch_and_collect(page)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    async def _fetch_and_collect_async(self, page):
+        start = time.perf_counter()
+        try:
+            return await super()._fetch_and_collect_async(page)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[int(round(q * (len(ordered) - 1)))]
+
+
+def run_one(pages, args):
+    if args.workers:
+        page_scheduler.WORKERS = args.workers
+
+    config = MockConfig(
+        total_pages=pages, latency_ms=args.latency_ms, error_rate=args.error_rate,
+        expire_after=args.expire_after, duplicate_rate=args.duplicate_rate,
+    )
+    server = MockServerProcess(config).start()
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            limiter = RateLimiter(rate=args.rate, max_rate=args.rate, burst=args.workers or 10)
+            api = APIClient(base_url=server.base_url, rate_limiter=limiter)
+            scraper = TimedScraper(
+                BENCHMARK_QUERY, async_mode=args.async_mode, streaming=args.stream,
+                solver=StubSolver(), api=api, output_dir=output_dir,
+            )
+
+            log = open(os.devnull, "w") if not args.verbose else sys.stdout
+            with contextlib.redirect_stdout(log):
+                start = time.perf_counter()
+                records = scraper.run()
+                elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+    return {
+        "pages": pages,
+        "records": records,
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(pages / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(scraper.latencies, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(scraper.latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "requests": server.requests_served,
+        "sessions": server.sessions_issued,
+    }
+
+
+def _run_in_child(pages, args, results):
+    results.put(run_one(pages, args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end scraper throughput benchmark")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="comma-separated page counts to benchmark")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--expire-after", type=int, default=0,
+                        help="requests per session before the server answers 403")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="client rate limit in requests/s")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="override page_scheduler.WORKERS")
+    parser.add_argument("--async", dest="async_mode", action="store_true")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--json", metavar="PATH", help="also write results as JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    rows = []
+    print(f"{'pages':>8} {'records':>9} {'seconds':>9} {'pages/s':>9} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'requests':>9} {'sessions':>9}")
+
+    # Each size runs in its own process so peak RSS is per size.
+    for pages in sizes:
+        results = multiprocessing.Queue()
+        child = multiprocessing.Process(target=_run_in_child, args=(pages, args, results))
+        child.start()
+        while True:
+            try:
+                row = results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not child.is_alive():
+                    raise RuntimeError(f"Benchmark for {pages} pages exited early")
+        child.join()
+        rows.append(row)
+        print(f"{row['pages']:>8} {row['records']:>9} {row['seconds']:>9} "
+              f"{row['pages_per_s']:>9} {row['p50_ms']:>8} {row['p99_ms']:>8} "
+              f"{row['peak_rss_mb']:>8} {row['requests']:>9} {row['sessions']:>9}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
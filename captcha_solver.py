@@ -1,12 +1,13 @@
 import os
-import json
-import wave
 import time
-import tempfile
-import subprocess
+import queue
+import threading
 import urllib.request
-from vosk import Model, KaldiRecognizer
-from playwright.sync_api import sync_playwright
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from transcriber import get_transcriber
+from metrics import METRICS
 
 BASE_URL = "https://scraping-trial-test.vercel.app"
 USER_AGENT = (
@@ -14,78 +15,137 @@ USER_AGENT = (
     "AppleWebKit/537.36 (KHTML, like Gecko) "
     "Chrome/134.0.0.0 Safari/537.36"
 )
-VOSK_MODEL_URL = "https://alphacephei.com/vosk/models/vosk-model-small-en-us-0.15.zip"
-VOSK_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vosk-model")
 MAX_CAPTCHA_ATTEMPTS = 5
+BROWSER_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "browser-profile")
+WARM_PAGES = 1
+WARM_PAGE_TTL = 300  # seconds before a pre-loaded page is reloaded
+SOLVE_TIMEOUT = 120  # seconds; overall deadline for one solve
+VERDICT_POLL_MS = 250
+MAX_RACERS = 4       # cap on concurrent solves, to stay under reCAPTCHA's rate limiting
+RACE_STARTUP = 30    # seconds allowed on top of SOLVE_TIMEOUT for racers to launch
+RACER_STOP_TIMEOUT = 15  # seconds a racer gets to close its browser on shutdown
+MIN_CONFIDENCE = 0.6  # below this the challenge is reloaded instead of submitted
+CONFIDENCE_BUCKETS = (0.2, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
 
 
 class CaptchaSolverError(Exception):
     pass
 
 
-class CaptchaSolver:
+class CaptchaDeadlineError(CaptchaSolverError):
+    pass
 
-    def __init__(self, headless=True):
-        self.headless = headless
-        self._model = None
 
-    def _ensure_vosk_model(self):
-        if self._model:
-            return
-        model_path = VOSK_MODEL_DIR
-        if not os.path.exists(model_path):
-            print("[CAPTCHA] Downloading Vosk speech model (~50 MB)...")
-            zip_path = model_path + ".zip"
-            urllib.request.urlretrieve(VOSK_MODEL_URL, zip_path)
-            import zipfile
-            with zipfile.ZipFile(zip_path, 'r') as zf:
-                extracted_name = zf.namelist()[0].split('/')[0]
-                zf.extractall(os.path.dirname(model_path))
-            extracted_path = os.path.join(os.path.dirname(model_path), extracted_name)
-            if extracted_path != model_path:
-                os.rename(extracted_path, model_path)
-            os.remove(zip_path)
-            print("[CAPTCHA] Vosk model ready.")
-        self._model = Model(model_path)
-
-    def _transcribe_audio(self, audio_path):
-        self._ensure_vosk_model()
-        wav_path = audio_path.replace(".mp3", ".wav")
-        subprocess.run(
-            [
-                "ffmpeg", "-y", "-i", audio_path,
-                "-ar", "16000", "-ac", "1", "-sample_fmt", "s16",
-                wav_path,
-            ],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            check=True,
-        )
+class CaptchaRateLimitedError(CaptchaSolverError):
+    pass
+
+
+class CaptchaCancelledError(CaptchaSolverError):
+    pass
 
-        wf = wave.open(wav_path, "rb")
-        rec = KaldiRecognizer(self._model, wf.getframerate())
-        rec.SetWords(True)
 
+def _racer_main(headless, timeout, user_data_dir, commands, results, active):
+    # A racer lives across solves, keeping its Vosk model loaded and its
+    # persistent browser warm. Each command is a solve generation; the solve
+    # is abandoned once the parent moves active off that generation.
+    get_transcriber()
+    solver = CaptchaSolver(headless=headless, timeout=timeout, persistent=True,
+                           user_data_dir=user_data_dir)
+    try:
         while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
+            generation = commands.get()
+            if generation is None:
                 break
-            rec.AcceptWaveform(data)
+            if active.value != generation:
+                continue
+            solver._cancelled = lambda: active.value != generation
+            try:
+                results.put((generation, "token", solver._solve()))
+            except CaptchaRateLimitedError as e:
+                results.put((generation, "rate_limited", str(e)))
+            except Exception as e:
+                results.put((generation, "error", str(e)))
+    finally:
+        solver.close()
 
-        final = json.loads(rec.FinalResult())
-        result_text = final.get("text", "").strip()
-        wf.close()
 
-        try:
-            os.remove(wav_path)
-        except OSError:
-            pass
+class CaptchaSolver:
+
+    def __init__(self, headless=True, persistent=False,
+                 user_data_dir=BROWSER_PROFILE_DIR, warm_pages=WARM_PAGES,
+                 timeout=SOLVE_TIMEOUT, race=0, min_confidence=MIN_CONFIDENCE):
+        if persistent and race > 1:
+            raise ValueError("CAPTCHA racers keep their own persistent browsers; "
+                             "use either persistent or race, not both")
+        self.headless = headless
+        self.timeout = timeout
+        self.min_confidence = min_confidence
+        self.race = min(race, MAX_RACERS)
+        self._deadline = None
+        self._audio_href = None
+        self.persistent = persistent
+        self.user_data_dir = user_data_dir
+        self.warm_pages = warm_pages
+
+        # Sync Playwright objects may only be used from the thread that
+        # created them, so persistent mode drives the browser from one thread.
+        self._browser_thread = None
+        self._playwright = None
+        self._context = None
+        self._warm = deque()
+        self._cancelled = None
+        self._racers = []
+        self._race_results = None
+        self._race_active = None
+        self._generation = 0
+        # One race at a time: a second solve() would bump the generation and
+        # orphan the first race, and both would respawn racers.
+        self._race_lock = threading.Lock()
+        self._closing = False
+        if persistent:
+            self._browser_thread = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="captcha-browser"
+            )
+
+    @property
+    def max_solve_seconds(self):
+        # How long one solve() may run before it fails on its deadline.
+        return self.timeout + (RACE_STARTUP if self.race > 1 else 0)
 
-        return result_text
+    def _transcribe_audio(self, audio_bytes):
+        with METRICS.span("captcha_transcribe_seconds"):
+            hypotheses = get_transcriber().transcribe_nbest(audio_bytes)
+        if hypotheses:
+            METRICS.observe("captcha_transcribe_confidence", hypotheses[0][1],
+                            buckets=CONFIDENCE_BUCKETS)
+        return hypotheses
 
     def solve(self):
+        start = time.perf_counter()
+        try:
+            token = self._solve()
+        except Exception:
+            METRICS.inc("captcha_solves_total", outcome="failed")
+            raise
+        finally:
+            METRICS.observe("captcha_solve_seconds", time.perf_counter() - start)
+        METRICS.inc("captcha_solves_total", outcome="solved")
+        return token
+
+    def _solve(self):
+        if self.race > 1:
+            with self._race_lock:
+                return self._solve_race()
+
         print("[CAPTCHA] Starting automated audio reCAPTCHA solve...")
-        self._ensure_vosk_model()
+        get_transcriber()
+
+        if self.persistent:
+            token = self._browser_thread.submit(self._solve_persistent).result()
+            self._browser_thread.submit(self._top_up)
+            return token
+
+        from playwright.sync_api import sync_playwright
 
         with sync_playwright() as p:
             browser = p.chromium.launch(headless=self.headless)
@@ -94,7 +154,6 @@ class CaptchaSolver:
 
             try:
                 page.goto(f"{BASE_URL}/", wait_until="networkidle", timeout=30000)
-                time.sleep(2)
 
                 token = self._attempt_solve(page)
                 if token:
@@ -106,18 +165,271 @@ class CaptchaSolver:
             finally:
                 browser.close()
 
+    def _start_racers(self):
+        # Spawned, not forked, so each racer gets its own Playwright and
+        # model; dead racers are replaced before every race.
+        context = multiprocessing.get_context("spawn")
+        if self._race_results is None:
+            self._race_results = context.Queue()
+            self._race_active = context.Value("i", 0)
+        self._racers = [racer for racer in self._racers if racer[0].is_alive()]
+        while len(self._racers) < self.race:
+            index = len(self._racers)
+            commands = context.Queue()
+            process = context.Process(
+                target=_racer_main,
+                args=(self.headless, self.timeout, f"{self.user_data_dir}-racer{index}",
+                      commands, self._race_results, self._race_active),
+                daemon=True,
+            )
+            process.start()
+            self._racers.append((process, commands))
+
+    def _solve_race(self):
+        # Every racer solves the same generation; the first token wins and
+        # the others abandon their solve at their next deadline check.
+        self._start_racers()
+        self._generation += 1
+        generation = self._generation
+        self._race_active.value = generation
+        print(f"[CAPTCHA] Racing {len(self._racers)} independent solves...")
+        for _, commands in self._racers:
+            commands.put(generation)
+
+        errors = []
+        deadline = time.monotonic() + self.timeout + RACE_STARTUP
+        try:
+            while len(errors) < len(self._racers):
+                if self._closing:
+                    raise CaptchaCancelledError("Solver closed")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CaptchaDeadlineError(
+                        f"CAPTCHA race exceeded {self.timeout}s deadline"
+                    )
+                try:
+                    result_generation, kind, value = self._race_results.get(
+                        timeout=min(remaining, 1.0)
+                    )
+                except queue.Empty:
+                    if not any(process.is_alive() for process, _ in self._racers):
+                        break
+                    continue
+                if result_generation != generation:
+                    continue
+
+                if kind == "token":
+                    print(f"[CAPTCHA] Race won after {len(errors)} failed racers.")
+                    return value
+                if kind == "rate_limited":
+                    raise CaptchaRateLimitedError(value)
+                print(f"[CAPTCHA] Racer failed: {value}")
+                errors.append(value)
+        finally:
+            self._race_active.value = 0
+
+        raise CaptchaSolverError(
+            f"All {len(self._racers)} racing solves failed"
+            + (f"; last error: {errors[-1]}" if errors else "")
+        )
+
+    def _stop_racers(self):
+        for _, commands in self._racers:
+            commands.put(None)
+        for process, _ in self._racers:
+            process.join(RACER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._racers = []
+
+    def _start_browser(self):
+        from playwright.sync_api import sync_playwright
+
+        print("[CAPTCHA] Launching persistent browser context...")
+        self._playwright = sync_playwright().start()
+        self._context = self._playwright.chromium.launch_persistent_context(
+            self.user_data_dir, headless=self.headless, user_agent=USER_AGENT
+        )
+
+    def _load_page(self):
+        page = self._context.new_page()
+        page.goto(f"{BASE_URL}/", wait_until="networkidle", timeout=30000)
+        return page, time.monotonic()
+
+    def _top_up(self):
+        try:
+            if self._context is None:
+                self._start_browser()
+            while len(self._warm) < self.warm_pages and not self._closing:
+                self._warm.append(self._load_page())
+        except Exception as e:
+            print(f"[CAPTCHA] Could not pre-warm page: {e}")
+
+    def _take_page(self):
+        while self._warm:
+            page, loaded_at = self._warm.popleft()
+            if page.is_closed():
+                continue
+            if time.monotonic() - loaded_at > WARM_PAGE_TTL:
+                page.reload(wait_until="networkidle", timeout=30000)
+            return page
+        page, _ = self._load_page()
+        return page
+
+    def _solve_persistent(self):
+        if self._context is None:
+            self._start_browser()
+
+        page = self._take_page()
+        try:
+            token = self._attempt_solve(page)
+        finally:
+            page.close()
+
+        if token:
+            return token
+        raise CaptchaSolverError(
+            f"Failed to solve CAPTCHA after {MAX_CAPTCHA_ATTEMPTS} attempts"
+        )
+
+    def _close_browser(self):
+        while self._warm:
+            page, _ = self._warm.popleft()
+            page.close()
+        if self._context is not None:
+            self._context.close()
+            self._context = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def close(self):
+        # A solve still running (a background spare, say) is cancelled at its
+        # next deadline check instead of holding up the browser shutdown.
+        self._closing = True
+        if self._race_active is not None:
+            self._race_active.value = 0
+        # A race in progress notices _closing within a second.
+        with self._race_lock:
+            self._stop_racers()
+        if self._browser_thread is None:
+            return
+        try:
+            self._browser_thread.submit(self._close_browser).result()
+        finally:
+            self._browser_thread.shutdown(wait=True)
+            self._browser_thread = None
+
+    def _remaining_ms(self, cap_ms):
+        if self._closing:
+            raise CaptchaCancelledError("Solver closed")
+        if self._cancelled is not None and self._cancelled():
+            raise CaptchaCancelledError("Another racer already solved the CAPTCHA")
+        remaining = self._deadline - time.monotonic()
+        if remaining <= 0:
+            raise CaptchaDeadlineError(
+                f"CAPTCHA solve exceeded {self.timeout}s deadline"
+            )
+        return min(cap_ms, remaining * 1000)
+
+    def _wait_for_checkbox_outcome(self, page):
+        # Clicking the checkbox either yields a token straight away or opens
+        # the challenge iframe; wait for whichever happens first.
+        handle = page.wait_for_function(
+            """() => {
+                const el = document.querySelector('#g-recaptcha-response');
+                if (el && el.value.length > 20) return 'token';
+                const f = document.querySelector('iframe[src*="api2/bframe"]');
+                if (f && f.getBoundingClientRect().height > 0
+                        && getComputedStyle(f).visibility === 'visible') return 'challenge';
+                return null;
+            }""",
+            timeout=self._remaining_ms(10000),
+        )
+        return handle.json_value()
+
+    def _challenge_frame(self, page):
+        for frame in page.frames:
+            if "api2/bframe" in frame.url:
+                return frame
+        raise CaptchaSolverError("reCAPTCHA challenge frame not found")
+
+    def _wait_for_audio(self, frame, previous_href):
+        # Resolves once a new audio challenge is ready (its download link
+        # points somewhere new) or reCAPTCHA shows an error instead.
+        handle = frame.wait_for_function(
+            """(previous) => {
+                const a = document.querySelector('.rc-audiochallenge-tdownload-link');
+                if (a && a.href && a.href !== previous) return {href: a.href};
+                for (const sel of ['.rc-doscaptcha-header-text',
+                                   '.rc-audiochallenge-error-message']) {
+                    const e = document.querySelector(sel);
+                    const text = e && e.offsetParent !== null && e.textContent.trim();
+                    if (text) return {error: text};
+                }
+                return null;
+            }""",
+            arg=previous_href,
+            timeout=self._remaining_ms(10000),
+        )
+        return handle.json_value()
+
+    def _wait_for_verdict(self, page, frame, previous_href):
+        # After verify, either the token lands on the page or the challenge
+        # frame shows an error / a fresh challenge.
+        while True:
+            token = self._wait_for_token(page, self._remaining_ms(VERDICT_POLL_MS))
+            if token:
+                return token, None
+            state = frame.evaluate(
+                """(previous) => {
+                    const e = document.querySelector('.rc-audiochallenge-error-message');
+                    const text = e && e.offsetParent !== null && e.textContent.trim();
+                    if (text) return text;
+                    const a = document.querySelector('.rc-audiochallenge-tdownload-link');
+                    if (a && a.href && a.href !== previous) return 'New challenge issued';
+                    return null;
+                }""",
+                previous_href,
+            )
+            if state:
+                return None, state
+
+    def _wait_for_token(self, page, timeout_ms):
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        try:
+            handle = page.wait_for_function(
+                """() => {
+                    const el = document.querySelector('#g-recaptcha-response');
+                    return el && el.value.length > 20 ? el.value : null;
+                }""",
+                timeout=timeout_ms,
+            )
+            return handle.json_value()
+        except PlaywrightTimeoutError:
+            return None
+
     def _attempt_solve(self, page):
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        self._deadline = time.monotonic() + self.timeout
+        self._audio_href = None
+
         anchor_frame = page.frame_locator('iframe[src*="api2/anchor"]')
         checkbox = anchor_frame.locator('#recaptcha-anchor')
-        checkbox.wait_for(state="visible", timeout=10000)
+        checkbox.wait_for(state="visible", timeout=self._remaining_ms(10000))
         checkbox.click()
         print("[CAPTCHA] Clicked reCAPTCHA checkbox.")
-        time.sleep(2)
 
-        token = self._check_token(page)
-        if token:
+        try:
+            outcome = self._wait_for_checkbox_outcome(page)
+        except PlaywrightTimeoutError:
+            outcome = "challenge"
+        if outcome == "token":
             print("[CAPTCHA] Solved with checkbox click alone (no challenge).")
-            return token
+            return self._check_token(page)
 
         for attempt in range(1, MAX_CAPTCHA_ATTEMPTS + 1):
             print(f"[CAPTCHA] Audio solve attempt {attempt}/{MAX_CAPTCHA_ATTEMPTS}...")
@@ -125,89 +437,71 @@ class CaptchaSolver:
                 token = self._solve_audio_challenge(page, attempt)
                 if token:
                     return token
+            except (CaptchaDeadlineError, CaptchaRateLimitedError, CaptchaCancelledError):
+                raise
             except Exception as e:
                 print(f"[CAPTCHA] Attempt {attempt} failed: {e}")
-                time.sleep(1)
 
         return None
 
+    def _reload_challenge(self, frame):
+        reload_btn = frame.locator('#recaptcha-reload-button')
+        if reload_btn.is_visible():
+            reload_btn.click()
+
     def _solve_audio_challenge(self, page, attempt):
-        challenge_frame = page.frame_locator('iframe[src*="api2/bframe"]')
+        frame = self._challenge_frame(page)
 
         if attempt == 1:
-            audio_btn = challenge_frame.locator('#recaptcha-audio-button')
-            audio_btn.wait_for(state="visible", timeout=10000)
+            audio_btn = frame.locator('#recaptcha-audio-button')
+            audio_btn.wait_for(state="visible", timeout=self._remaining_ms(10000))
             audio_btn.click()
             print("[CAPTCHA] Switched to audio challenge.")
-            time.sleep(2)
-
-        try:
-            error_msg = challenge_frame.locator('.rc-audiochallenge-error-message')
-            if error_msg.is_visible(timeout=1000):
-                err_text = error_msg.text_content()
-                if err_text and "try again later" in err_text.lower():
-                    raise CaptchaSolverError("Rate limited by reCAPTCHA. Try again later.")
-        except Exception:
-            pass
 
-        download_link = challenge_frame.locator(
-            '.rc-audiochallenge-tdownload-link'
-        )
-        download_link.wait_for(state="visible", timeout=10000)
-        audio_url = download_link.get_attribute("href")
+        state = self._wait_for_audio(frame, self._audio_href)
+        if "error" in state:
+            if "try again later" in state["error"].lower():
+                raise CaptchaRateLimitedError("Rate limited by reCAPTCHA. Try again later.")
+            self._reload_challenge(frame)
+            raise CaptchaSolverError(f"Challenge error: {state['error']}")
 
-        if not audio_url:
-            raise CaptchaSolverError("Could not find audio download URL")
+        audio_url = state["href"]
+        self._audio_href = audio_url
 
         print(f"[CAPTCHA] Downloading audio challenge...")
-        tmp_dir = tempfile.mkdtemp()
-        audio_path = os.path.join(tmp_dir, "captcha_audio.mp3")
-        urllib.request.urlretrieve(audio_url, audio_path)
+        with urllib.request.urlopen(audio_url, timeout=15) as response:
+            audio_bytes = response.read()
 
         print("[CAPTCHA] Transcribing with Vosk (offline)...")
-        transcription = self._transcribe_audio(audio_path)
-        print(f"[CAPTCHA] Transcription: '{transcription}'")
-
-        try:
-            os.remove(audio_path)
-            os.rmdir(tmp_dir)
-        except OSError:
-            pass
+        hypotheses = self._transcribe_audio(audio_bytes)
+        transcription, confidence = hypotheses[0] if hypotheses else ("", 0.0)
+        print(f"[CAPTCHA] Transcription: '{transcription}' (confidence {confidence:.2f})")
 
         if not transcription:
-            reload_btn = challenge_frame.locator('#recaptcha-reload-button')
-            if reload_btn.is_visible():
-                reload_btn.click()
-                time.sleep(2)
+            self._reload_challenge(frame)
             raise CaptchaSolverError("Empty transcription")
 
-        response_input = challenge_frame.locator('#audio-response')
-        response_input.fill(transcription)
-        time.sleep(0.5)
+        # A doubtful answer costs a verify round-trip and then a new challenge
+        # anyway, so skip straight to the new challenge. The last attempt
+        # submits whatever it has.
+        if confidence < self.min_confidence and attempt < MAX_CAPTCHA_ATTEMPTS:
+            self._reload_challenge(frame)
+            raise CaptchaSolverError(
+                f"Transcription confidence {confidence:.2f} below {self.min_confidence}"
+            )
 
-        verify_btn = challenge_frame.locator('#recaptcha-verify-button')
-        verify_btn.click()
+        frame.locator('#audio-response').fill(transcription)
+        frame.locator('#recaptcha-verify-button').click()
         print("[CAPTCHA] Submitted transcription.")
-        time.sleep(3)
 
-        token = self._check_token(page)
+        token, error = self._wait_for_verdict(page, frame, audio_url)
         if token:
             print("[CAPTCHA] Audio CAPTCHA solved successfully!")
             return token
 
-        try:
-            error_msg = challenge_frame.locator('.rc-audiochallenge-error-message')
-            if error_msg.is_visible(timeout=2000):
-                err_text = error_msg.text_content()
-                if err_text and len(err_text.strip()) > 0:
-                    print(f"[CAPTCHA] Challenge error: {err_text.strip()}")
-                    reload_btn = challenge_frame.locator('#recaptcha-reload-button')
-                    if reload_btn.is_visible():
-                        reload_btn.click()
-                        time.sleep(2)
-        except Exception:
-            pass
-
+        print(f"[CAPTCHA] Challenge error: {error}")
+        if error != "New challenge issued":
+            self._reload_challenge(frame)
         return None
 
     def _check_token(self, page):
@@ -0,0 +1,104 @@
+from array import array
+
+# Fields with few distinct values are stored once per value plus a compact
+# code per record, instead of one str reference per record.
+DICTIONARY_FIELDS = ("status", "agent_name", "agent_address")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError(
+            "Parquet/Arrow export requires pyarrow — pip install pyarrow"
+        ) from None
+    return pyarrow
+
+
+def arrow_schema(fields, dictionary_fields=DICTIONARY_FIELDS):
+    # One schema for buffered and streamed columnar output, so a file's
+    # column types do not depend on whether --stream was used.
+    pa = _require_pyarrow()
+    dictionary = pa.dictionary(pa.uint32(), pa.string())
+    return pa.schema([
+        (field, dictionary if field in dictionary_fields else pa.string())
+        for field in fields
+    ])
+
+
+class DictionaryColumn:
+
+    def __init__(self):
+        self.values = []
+        self.codes = array('I')
+        self._index = {}
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._index[value] = code
+        self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        values = self.values
+        for code in self.codes:
+            yield values[code]
+
+    def to_arrow(self):
+        # A null (an explicit JSON null from the API) stays a Python None in
+        # the column but becomes a null index in Arrow; Parquet refuses null
+        # dictionary values. Its dictionary slot holds an unused "".
+        pa = _require_pyarrow()
+        indices = pa.array(self.codes, type=pa.uint32())
+        values = self.values
+        null_code = self._index.get(None)
+        if null_code is not None:
+            import pyarrow.compute as pc
+            indices = pc.if_else(pc.equal(indices, null_code),
+                                 pa.scalar(None, pa.uint32()), indices)
+            values = list(values)
+            values[null_code] = ""
+        return pa.DictionaryArray.from_arrays(indices, pa.array(values, type=pa.string()))
+
+
+class ColumnStore:
+
+    def __init__(self, fields, dictionary_fields=DICTIONARY_FIELDS):
+        self.fields = list(fields)
+        self.dictionary_fields = dictionary_fields
+        self.columns = {
+            field: DictionaryColumn() if field in dictionary_fields else []
+            for field in self.fields
+        }
+
+    def append(self, record):
+        for field in self.fields:
+            self.columns[field].append(record.get(field, ""))
+
+    def __len__(self):
+        return len(self.columns[self.fields[0]])
+
+    def iter_rows(self):
+        return zip(*(self.columns[field] for field in self.fields))
+
+    def iter_records(self):
+        fields = self.fields
+        for row in self.iter_rows():
+            yield dict(zip(fields, row))
+
+    def to_arrow_table(self):
+        pa = _require_pyarrow()
+        arrays = []
+        for field in self.fields:
+            column = self.columns[field]
+            if isinstance(column, DictionaryColumn):
+                arrays.append(column.to_arrow())
+            else:
+                arrays.append(pa.array(column, type=pa.string()))
+        return pa.Table.from_arrays(arrays, schema=arrow_schema(self.fields,
+                                                                self.dictionary_fields))
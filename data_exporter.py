@@ -1,7 +1,12 @@
 import os
-import csv
 import json
+import time
+import hashlib
 import threading
+from metrics import METRICS
+from columnar import ColumnStore
+from manifest import manifest_path, write_manifest, verify_files
+from export_writers import make_writer, write_parallel
 
 
 FIELD_ORDER = [
@@ -24,17 +29,61 @@ CSV_HEADERS = {
     "agent_email": "Agent Email",
 }
 
+CHECKPOINT_INTERVAL = 10  # streamed batches between fsync checkpoints
+
+
+def record_hash(record):
+    content = "\x1f".join(str(record.get(f) or "") for f in FIELD_ORDER)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def normalize_results(api_results):
+    records = []
+    append = records.append
+    for item in api_results:
+        agent = item.get("agent") or {}
+        append({
+            "business_name": item.get("businessName", ""),
+            "registration_id": item.get("registrationId"),
+            "status": item.get("status", ""),
+            "filing_date": item.get("filingDate", ""),
+            "agent_name": agent.get("name", ""),
+            "agent_address": agent.get("address", ""),
+            "agent_email": agent.get("email", ""),
+        })
+    return records
+
 
 class DataExporter:
 
-    def __init__(self, query, output_dir="output"):
+    def __init__(self, query, output_dir="output", streaming=False, formats=(),
+                 dedup_index=None):
         self.query = query
         self.output_dir = output_dir
-        self.results = []
+        self.streaming = streaming
+        self.formats = tuple(formats)
+        self.store = ColumnStore(FIELD_ORDER)
         self.seen_ids = set()
+        self.count = 0
+        self.duplicate_count = 0
+        self.status_counts = {}
+        self.dedup_index = dedup_index
+        self.delta_counts = {"new": 0, "changed": 0, "unchanged": 0}
         self._lock = threading.Lock()
 
+        self._stream_writers = None
+        self._batches_since_sync = 0
+        self._written = {}
+        self.failed_formats = {}
+        self.manifest = None
+
+        # Builds (and so validates) every writer up front; unknown formats or
+        # missing optional libraries fail before any page is fetched.
+        self._make_writers()
+
         os.makedirs(self.output_dir, exist_ok=True)
+        if self.streaming:
+            self._open_streams()
 
     @property
     def json_path(self):
@@ -44,60 +93,204 @@ class DataExporter:
     def csv_path(self):
         return os.path.join(self.output_dir, f"{self.query}.csv")
 
+    @property
+    def ndjson_path(self):
+        return os.path.join(self.output_dir, f"{self.query}.ndjson")
+
+    @property
+    def results(self):
+        return list(self.store.iter_records())
+
+    @property
+    def manifest_path(self):
+        return manifest_path(self.output_dir, self.query)
+
+    def format_path(self, fmt):
+        return os.path.join(self.output_dir, f"{self.query}.{fmt}")
+
+    def _required_formats(self):
+        return ["json", "csv"] + (["ndjson"] if self.streaming else [])
+
+    def _output_formats(self):
+        formats = self._required_formats()
+        return formats + [fmt for fmt in self.formats if fmt not in formats]
+
+    def _make_writers(self):
+        base_path = os.path.join(self.output_dir, self.query)
+        headers = [CSV_HEADERS[f] for f in FIELD_ORDER]
+        required = self._required_formats()
+        writers = []
+        for fmt in self._output_formats():
+            writers.append(make_writer(
+                fmt, base_path, FIELD_ORDER, headers=headers,
+                # Streamed JSON is one compact record per line; the NDJSON is
+                # written in place so it can be tailed during the run.
+                pretty=not self.streaming, in_place=self.streaming and fmt == "ndjson",
+                # A failing --format output must not cost the JSON and CSV.
+                required=fmt in required,
+            ))
+        return writers
+
+    def _open_streams(self):
+        self._stream_writers = self._make_writers()
+        for writer in list(self._stream_writers):
+            try:
+                writer.open()
+            except Exception as e:
+                self._drop_stream_writer(writer, e)
+
+    def _format_failed(self, writer, error):
+        self.failed_formats[writer.format] = str(error)
+        print(f"[EXPORT] {writer.format.upper()} export failed and was skipped: {error}")
+
+    def _drop_stream_writer(self, writer, error):
+        if writer.required:
+            raise error
+        writer.discard()
+        self._stream_writers.remove(writer)
+        self._format_failed(writer, error)
+
+    def _append_batch(self, records):
+        rows = [tuple(record.get(f, "") for f in FIELD_ORDER) for record in records]
+        # Every batch reaches the OS before the next one is taken, so killing
+        # the process loses at most the batch being written; fsync, which
+        # also covers a power loss, runs every CHECKPOINT_INTERVAL batches.
+        for writer in list(self._stream_writers):
+            try:
+                writer.write_rows(rows)
+                writer.flush()
+            except Exception as e:
+                self._drop_stream_writer(writer, e)
+
+        self._batches_since_sync += 1
+        if self._batches_since_sync >= CHECKPOINT_INTERVAL:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        for writer in list(self._stream_writers):
+            try:
+                writer.sync()
+            except Exception as e:
+                self._drop_stream_writer(writer, e)
+        self._batches_since_sync = 0
+
     def add_results(self, api_results):
-        new_count = 0
+        return self.add_records(normalize_results(api_results))
+
+    def add_records(self, records):
+        # Records arrive already normalized by the fetching worker, so the
+        # lock only covers dedup, the delta claim and storage.
+        wait_start = time.perf_counter()
         with self._lock:
-            for item in api_results:
-                reg_id = item.get("registrationId")
-                if reg_id in self.seen_ids:
-                    continue
-
-                agent = item.get("agent", {})
-                record = {
-                    "business_name": item.get("businessName", ""),
-                    "registration_id": reg_id,
-                    "status": item.get("status", ""),
-                    "filing_date": item.get("filingDate", ""),
-                    "agent_name": agent.get("name", ""),
-                    "agent_address": agent.get("address", ""),
-                    "agent_email": agent.get("email", ""),
-                }
-                self.results.append(record)
-                self.seen_ids.add(reg_id)
-                new_count += 1
-
-        return new_count
+            acquired = time.perf_counter()
+            seen_ids = self.seen_ids
+            new_records = []
+            for record in records:
+                reg_id = record["registration_id"]
+                if reg_id not in seen_ids:
+                    seen_ids.add(reg_id)
+                    new_records.append(record)
+            self.duplicate_count += len(records) - len(new_records)
+            if self.dedup_index is not None and new_records:
+                new_records = self._filter_delta(new_records)
+            for record in new_records:
+                if not self.streaming:
+                    self.store.append(record)
+                status = record["status"]
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self.count += len(new_records)
+
+            if self.streaming and new_records:
+                self._append_batch(new_records)
+            released = time.perf_counter()
+
+        METRICS.observe("exporter_lock_wait_seconds", acquired - wait_start)
+        METRICS.observe("exporter_lock_hold_seconds", released - acquired)
+        METRICS.inc("exporter_records_total", len(new_records), outcome="new")
+        METRICS.inc("exporter_records_total", len(records) - len(new_records),
+                    outcome="duplicate")
+        return len(new_records)
+
+    def load_records(self, path):
+        # Adds the records of a JSON export written by another DataExporter,
+        # deduplicating them against everything added so far.
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        return self.add_records(
+            [{field: record.get(field, "") for field in FIELD_ORDER} for record in records]
+        )
+
+    def load_existing(self):
+        # Seeds the exporter with the records of the previous run's output,
+        # so an incremental run can append to it instead of replacing it.
+        if not os.path.exists(self.json_path):
+            return 0
+        loaded = self.load_records(self.json_path)
+        print(f"[EXPORT] Loaded {loaded} existing records from {self.json_path}")
+        return loaded
+
+    def _filter_delta(self, records):
+        # Only records the index has never seen, or whose content changed
+        # since it last saw them, are exported.
+        outcomes = self.dedup_index.claim(
+            self.query, [(r["registration_id"], record_hash(r)) for r in records]
+        )
+        delta = []
+        for record, outcome in zip(records, outcomes):
+            self.delta_counts[outcome] += 1
+            if outcome != "unchanged":
+                delta.append(record)
+        return delta
 
     def save(self):
-        self._save_json()
-        self._save_csv()
+        with METRICS.span("exporter_save_seconds"):
+            if self.streaming:
+                self._finalize_streams()
+            else:
+                writers = self._make_writers()
+                failures = write_parallel(writers, self.store.iter_rows(), store=self.store)
+                for writer, error in failures.items():
+                    self._format_failed(writer, error)
+                self._record_written([w for w in writers if w not in failures])
+            self.manifest = write_manifest(self.manifest_path, self.query, FIELD_ORDER,
+                                           self._written)
         self._print_summary()
 
-    def _save_json(self):
-        tmp_path = self.json_path + ".tmp"
-        with open(tmp_path, 'w', encoding='utf-8') as f:
-            json.dump(self.results, f, indent=2, ensure_ascii=False)
-        os.replace(tmp_path, self.json_path)
-        print(f"[EXPORT] JSON saved: {self.json_path}")
-
-    def _save_csv(self):
-        tmp_path = self.csv_path + ".tmp"
-        display_headers = [CSV_HEADERS[f] for f in FIELD_ORDER]
-        with open(tmp_path, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.writer(f)
-            writer.writerow(display_headers)
-            for record in self.results:
-                writer.writerow([record.get(f, "") for f in FIELD_ORDER])
-        os.replace(tmp_path, self.csv_path)
-        print(f"[EXPORT] CSV saved: {self.csv_path}")
+    def commit_delta(self):
+        # Called only once the query is complete. A partial export is
+        # replaced by the resumed run's, which must export the same records
+        # again, so their claims stay uncommitted until then.
+        if self.dedup_index is not None:
+            self.dedup_index.commit(self.query)
+
+    def _finalize_streams(self):
+        with self._lock:
+            if self._stream_writers is None:
+                return
+            self._checkpoint()
+            for writer in list(self._stream_writers):
+                try:
+                    writer.finish()
+                except Exception as e:
+                    self._drop_stream_writer(writer, e)
+            for writer in self._stream_writers:
+                writer.commit()
+            self._record_written(self._stream_writers)
+            self._stream_writers = None
+
+    def _record_written(self, writers):
+        for writer in writers:
+            fmt = writer.format
+            entry = {"path": writer.path, "records": writer.records}
+            if writer.checksum is not None:
+                entry["blake2b"] = writer.checksum
+            self._written[fmt] = entry
+            print(f"[EXPORT] {fmt.upper()} saved: {writer.path}")
 
     def _print_summary(self):
-        total = len(self.results)
+        total = self.count
         unique_ids = len(self.seen_ids)
-        statuses = {}
-        for r in self.results:
-            s = r.get("status", "Unknown")
-            statuses[s] = statuses.get(s, 0) + 1
+        statuses = self.status_counts
 
         print(f"\n{'='*50}")
         print(f"  EXPORT SUMMARY")
@@ -105,45 +298,45 @@ class DataExporter:
         print(f"  Query:            {self.query}")
         print(f"  Total Records:    {total}")
         print(f"  Unique IDs:       {unique_ids}")
-        print(f"  Duplicates:       {total - unique_ids}")
+        print(f"  Duplicates:       {self.duplicate_count}")
+        if self.dedup_index is not None:
+            print(f"  Delta:            {self.delta_counts['new']} new, "
+                  f"{self.delta_counts['changed']} changed, "
+                  f"{self.delta_counts['unchanged']} unchanged")
         print(f"  Status Breakdown:")
-        for status, count in sorted(statuses.items()):
+        # An explicit null status sorts with the empty one.
+        for status, count in sorted(statuses.items(), key=lambda item: item[0] or ""):
             print(f"    {status}: {count}")
         print(f"  JSON: {self.json_path}")
         print(f"  CSV:  {self.csv_path}")
+        for fmt in self._output_formats()[2:]:
+            if fmt in self.failed_formats:
+                print(f"  {fmt.upper()}: FAILED ({self.failed_formats[fmt]})")
+            else:
+                print(f"  {fmt.upper()}: {self.format_path(fmt)}")
         print(f"{'='*50}\n")
 
     def verify_integrity(self):
+        # Compares the manifest the writers produced against the exporter's
+        # own count, without reading the files back.
         errors = []
-
-        try:
-            with open(self.json_path, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-            if len(json_data) != len(self.results):
-                errors.append(
-                    f"JSON record count mismatch: file={len(json_data)}, "
-                    f"memory={len(self.results)}"
-                )
-        except Exception as e:
-            errors.append(f"JSON validation failed: {e}")
-
-        try:
-            with open(self.csv_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                csv_rows = list(reader)
-            if len(csv_rows) != len(self.results):
-                errors.append(
-                    f"CSV record count mismatch: file={len(csv_rows)}, "
-                    f"memory={len(self.results)}"
-                )
-            expected_headers = [CSV_HEADERS[f] for f in FIELD_ORDER]
-            if reader.fieldnames != expected_headers:
-                errors.append(
-                    f"CSV header mismatch: expected {expected_headers}, "
-                    f"got {reader.fieldnames}"
-                )
-        except Exception as e:
-            errors.append(f"CSV validation failed: {e}")
+        if self.manifest is None:
+            errors.append("No manifest written; call save() first")
+        else:
+            digests = set()
+            for fmt, entry in self.manifest["files"].items():
+                path = os.path.join(self.output_dir, entry["path"])
+                if entry["records"] != self.count:
+                    errors.append(
+                        f"{fmt.upper()} record count mismatch: file={entry['records']}, "
+                        f"memory={self.count}"
+                    )
+                if not os.path.exists(path) or os.path.getsize(path) != entry["bytes"]:
+                    errors.append(f"{fmt.upper()} file changed since it was written: {path}")
+                if "blake2b" in entry:
+                    digests.add(entry["blake2b"])
+            if len(digests) > 1:
+                errors.append(f"Writers disagree on content checksum: {sorted(digests)}")
 
         if errors:
             print("[EXPORT] Integrity check FAILED:")
@@ -151,5 +344,24 @@ class DataExporter:
                 print(f"  - {err}")
             return False
 
-        print("[EXPORT] Integrity check PASSED — JSON and CSV are consistent.")
+        print(f"[EXPORT] Integrity check PASSED — {len(self.manifest['files'])} files "
+              f"match {self.manifest_path}.")
         return True
+
+
+def verify_export(query, output_dir="output"):
+    # Re-reads a finished export in constant memory and checks it against
+    # its manifest; used for after-the-fact checks.
+    path = manifest_path(output_dir, query)
+    try:
+        errors = verify_files(path, [CSV_HEADERS[f] for f in FIELD_ORDER])
+    except (OSError, ValueError) as e:
+        errors = [f"Manifest could not be read: {e}"]
+
+    if errors:
+        print(f"[EXPORT] Verification of '{query}' FAILED:")
+        for err in errors:
+            print(f"  - {err}")
+        return False
+    print(f"[EXPORT] Verification of '{query}' PASSED against {path}.")
+    return True
@@ -0,0 +1,87 @@
+import os
+import time
+import sqlite3
+import threading
+
+DEDUP_INDEX_NAME = "dedup_index.sqlite"
+LOOKUP_CHUNK = 500  # keeps IN (...) under SQLite's parameter limit
+
+
+class DedupIndex:
+    # Persistent registration_id -> content hash map shared by every query
+    # and run. Records are claimed while scraping and only committed once the
+    # owning query has completed, so a crash re-emits rather than loses a
+    # delta.
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pending_by_owner = {}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " registration_id TEXT PRIMARY KEY,"
+            " content_hash TEXT NOT NULL,"
+            " query TEXT,"
+            " first_seen REAL,"
+            " last_seen REAL)"
+        )
+        self._conn.commit()
+
+    def _lookup(self, ids):
+        stored = {}
+        for i in range(0, len(ids), LOOKUP_CHUNK):
+            chunk = ids[i:i + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = self._conn.execute(
+                "SELECT registration_id, content_hash FROM records "
+                f"WHERE registration_id IN ({placeholders})",
+                chunk,
+            )
+            stored.update(cursor.fetchall())
+        return stored
+
+    def claim(self, owner, entries):
+        # entries: [(registration_id, content_hash)]. Returns a list of
+        # "new", "changed" or "unchanged", one per entry.
+        with self._lock:
+            stored = self._lookup([reg_id for reg_id, _ in entries])
+            outcomes = []
+            for reg_id, content_hash in entries:
+                known = self._pending.get(reg_id, stored.get(reg_id))
+                if known == content_hash:
+                    outcomes.append("unchanged")
+                    continue
+                outcomes.append("new" if known is None else "changed")
+                self._pending[reg_id] = content_hash
+                self._pending_by_owner.setdefault(owner, []).append((reg_id, content_hash))
+            return outcomes
+
+    def commit(self, owner):
+        with self._lock:
+            rows = self._pending_by_owner.pop(owner, [])
+            if not rows:
+                return 0
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO records (registration_id, content_hash, query, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(registration_id) DO UPDATE SET "
+                "content_hash = excluded.content_hash, query = excluded.query, "
+                "last_seen = excluded.last_seen",
+                [(reg_id, content_hash, owner, now, now) for reg_id, content_hash in rows],
+            )
+            self._conn.commit()
+            for reg_id, content_hash in rows:
+                if self._pending.get(reg_id) == content_hash:
+                    del self._pending[reg_id]
+            return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,392 @@
+import os
+import time
+import shutil
+import socket
+import sqlite3
+import threading
+import multiprocessing
+from captcha_solver import CaptchaSolver, BROWSER_PROFILE_DIR
+from api_client import make_api_client
+from data_exporter import DataExporter
+from page_scheduler import PageScheduler, PageSource
+from session_manager import SessionManager
+from metrics import METRICS
+from BusinessSearchScraper import BusinessSearchScraper
+
+RANGE_SIZE = 25        # pages per leased range
+LEASE_TIMEOUT = 600    # seconds before a range held by a dead worker is handed out again
+LEASE_RENEW_INTERVAL = LEASE_TIMEOUT / 3  # heartbeat while a worker holds a range
+QUEUE_NAME = "queue.sqlite"
+
+
+def shard_dir(output_dir, query):
+    return os.path.join(output_dir, "shards", query)
+
+
+def range_dir(base_dir, start, end):
+    return os.path.join(base_dir, f"pages-{start:06d}-{end:06d}")
+
+
+def split_ranges(pages, size=RANGE_SIZE):
+    # Groups page numbers into contiguous (start, end) runs of at most size pages.
+    ranges = []
+    for page in sorted(pages):
+        if ranges and ranges[-1][1] == page - 1 and page - ranges[-1][0] < size:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return [tuple(r) for r in ranges]
+
+
+class ShardQueue:
+    # Page ranges in a SQLite file. Worker processes on the same host lease
+    # ranges from it (WAL mode needs shared memory, so not over a network
+    # filesystem). Holders renew their lease while they work; a lease that
+    # is not renewed for LEASE_TIMEOUT seconds is handed to the next worker
+    # that asks, and the old holder can then neither complete nor release it.
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ranges ("
+            " id INTEGER PRIMARY KEY, start INTEGER, end INTEGER,"
+            " state TEXT DEFAULT 'pending', owner TEXT, leased_until REAL)"
+        )
+
+    @property
+    def query(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'query'").fetchone()
+        return row[0] if row else None
+
+    def publish(self, query, pages):
+        ranges = split_ranges(pages)
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.execute("DELETE FROM ranges")
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('query', ?)", (query,)
+        )
+        self._conn.executemany(
+            "INSERT INTO ranges (start, end) VALUES (?, ?)", ranges
+        )
+        self._conn.execute("COMMIT")
+        return len(ranges)
+
+    def lease(self, owner):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT id, start, end FROM ranges"
+                " WHERE state = 'pending' OR (state = 'leased' AND leased_until < ?)"
+                " ORDER BY start LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE ranges SET state = 'leased', owner = ?, leased_until = ? WHERE id = ?",
+                    (owner, now + LEASE_TIMEOUT, row[0]),
+                )
+            self._conn.execute("COMMIT")
+        return row
+
+    def renew(self, range_id, owner):
+        # False once the lease has expired and been taken by another worker.
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE ranges SET leased_until = ?"
+                " WHERE id = ? AND owner = ? AND state = 'leased'",
+                (time.time() + LEASE_TIMEOUT, range_id, owner),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, range_id, owner, publish=None):
+        # publish() runs inside the write transaction, only while the range
+        # is still ours, so two holders of one range never both publish.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT 1 FROM ranges WHERE id = ? AND owner = ? AND state = 'leased'",
+                    (range_id, owner),
+                ).fetchone()
+                if row is not None:
+                    if publish is not None:
+                        publish()
+                    self._conn.execute(
+                        "UPDATE ranges SET state = 'done', leased_until = NULL WHERE id = ?",
+                        (range_id,),
+                    )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return row is not None
+
+    def release(self, range_id, owner):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE ranges SET state = 'pending', owner = NULL, leased_until = NULL"
+                " WHERE id = ? AND owner = ? AND state = 'leased'",
+                (range_id, owner),
+            )
+
+    def release_all(self):
+        # Used on resume: workers of the previous run are gone.
+        self._conn.execute(
+            "UPDATE ranges SET state = 'pending', owner = NULL, leased_until = NULL"
+            " WHERE state = 'leased'"
+        )
+
+    def counts(self):
+        counts = {"pending": 0, "leased": 0, "done": 0}
+        for state, count in self._conn.execute(
+            "SELECT state, COUNT(*) FROM ranges GROUP BY state"
+        ):
+            counts[state] = count
+        return counts
+
+    def done_ranges(self):
+        return self._conn.execute(
+            "SELECT start, end FROM ranges WHERE state = 'done' ORDER BY start"
+        ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ShardWorker(PageSource):
+    # Leases page ranges and fetches them with its own browser, CAPTCHA solve
+    # and API session. Each range is written by a DataExporter to a staging
+    # directory of this worker, which is moved into place as the range is
+    # marked done.
+
+    def __init__(self, queue_path, headless=True, async_mode=False,
+                 persistent_browser=False, index=0, captcha_race=0, cache=False):
+        self.queue_path = queue_path
+        self.base_dir = os.path.dirname(queue_path)
+        # Queues live in <output_dir>/shards/<query>/, see shard_dir().
+        self.output_dir = os.path.dirname(os.path.dirname(self.base_dir))
+        self.async_mode = async_mode
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.queue = ShardQueue(queue_path)
+        self.query = self.queue.query
+        self.solver = CaptchaSolver(
+            headless=headless, persistent=persistent_browser,
+            user_data_dir=f"{BROWSER_PROFILE_DIR}-shard{index}", race=captcha_race,
+        )
+        # No session store: sharing one stored session would put every
+        # worker back under a single session's rate limit.
+        self.api = make_api_client(self.output_dir, cache, reuse_session=False)
+        # Spares only after this worker's first renewal: N workers each
+        # solving a spare at launch would double the solves hitting the
+        # CAPTCHA while the workers' own first solves run.
+        self.sessions = SessionManager(self.solver, self.api, prefill_pages=None)
+        self.exporter = None
+        self.completed = 0
+
+    def _collect(self, page, records):
+        new_count = self.exporter.add_records(records)
+        print(f"[SHARD {self.worker_id}] '{self.query}' page {page} — {new_count} new")
+
+    def _heartbeat(self, range_id, stop, lost):
+        while not stop.wait(LEASE_RENEW_INTERVAL):
+            if not self.queue.renew(range_id, self.worker_id):
+                lost.set()
+                return
+
+    def _publish(self, staging, final):
+        if os.path.exists(final):
+            # Left by a holder that crashed between publishing and committing.
+            shutil.rmtree(final)
+        os.replace(staging, final)
+
+    def _run_range(self, range_id, start, end):
+        final = range_dir(self.base_dir, start, end)
+        staging = f"{final}.{self.worker_id}.part"
+        stop, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(range_id, stop, lost),
+                                     daemon=True)
+        heartbeat.start()
+        try:
+            self.exporter = DataExporter(self.query, output_dir=staging)
+            scheduler = PageScheduler(self.api, self.sessions, self.async_mode)
+            failed = scheduler.run([(self, p) for p in range(start, end + 1)])
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if failed or lost.is_set():
+            shutil.rmtree(staging, ignore_errors=True)
+        if lost.is_set():
+            print(f"[SHARD {self.worker_id}] Lease on {start}-{end} was lost; range dropped.")
+            return True
+        if failed:
+            # Another worker (or a resumed run) picks the range up again.
+            self.queue.release(range_id, self.worker_id)
+            print(f"[SHARD {self.worker_id}] {len(failed)} pages failed in {start}-{end}; "
+                  f"range released, stopping worker.")
+            return False
+
+        self.exporter.save()
+        if self.queue.complete(range_id, self.worker_id,
+                               publish=lambda: self._publish(staging, final)):
+            self.completed += 1
+        else:
+            shutil.rmtree(staging, ignore_errors=True)
+            print(f"[SHARD {self.worker_id}] Lease on {start}-{end} was lost; range dropped.")
+        return True
+
+    def run(self):
+        try:
+            if self.api.cache is None:
+                self.sessions.authenticate()
+            while True:
+                lease = self.queue.lease(self.worker_id)
+                if lease is None:
+                    break
+                range_id, start, end = lease
+                print(f"[SHARD {self.worker_id}] Leased pages {start}-{end} of '{self.query}'")
+                if not self._run_range(range_id, start, end):
+                    break
+        finally:
+            self.sessions.close()
+            self.queue.close()
+
+        METRICS.write_report(self.base_dir, f"worker-{self.worker_id}")
+        return self.completed
+
+
+def run_worker(queue_path, headless=True, async_mode=False, persistent_browser=False,
+               index=0, captcha_race=0, cache=False):
+    worker = ShardWorker(queue_path, headless=headless, async_mode=async_mode,
+                         persistent_browser=persistent_browser, index=index,
+                         captcha_race=captcha_race, cache=cache)
+    return worker.run()
+
+
+class ShardCoordinator:
+    # Fetches page 1, publishes the remaining pages as ranges, starts worker
+    # processes and merges their partial outputs with global dedup.
+
+    def __init__(self, query, shards, headless=True, async_mode=False, streaming=False,
+                 resume=False, persistent_browser=False, output_dir="output", formats=(),
+                 delta=False, incremental=False, captcha_race=0, cache=False,
+                 reuse_session=True):
+        self.query = query
+        self.shards = shards
+        self.captcha_race = captcha_race
+        self.cache = cache
+        self.headless = headless
+        self.async_mode = async_mode
+        self.resume = resume
+        self.persistent_browser = persistent_browser
+        self.output_dir = output_dir
+        self.base_dir = shard_dir(output_dir, query)
+        self.queue_path = os.path.join(self.base_dir, QUEUE_NAME)
+        solver = CaptchaSolver(headless=headless, persistent=persistent_browser,
+                               race=captcha_race)
+        api = make_api_client(output_dir, cache, reuse_session)
+        # The coordinator only fetches page 1; a spare would be a wasted solve.
+        self.scraper = BusinessSearchScraper(
+            query, async_mode=async_mode, streaming=streaming, resume=resume,
+            solver=solver, api=api, sessions=SessionManager(solver, api, spares=0),
+            output_dir=output_dir, formats=formats, delta=delta, incremental=incremental,
+        )
+        self.exporter = self.scraper.exporter
+
+    def _publish(self, queue, remaining):
+        if self.resume and queue.query == self.query and any(queue.counts().values()):
+            queue.release_all()
+            counts = queue.counts()
+            print(f"[SHARD] Resuming queue: {counts['done']} ranges done, "
+                  f"{counts['pending']} pending.")
+            return
+
+        self._remove_ranges()
+        count = queue.publish(self.query, remaining)
+        print(f"[SHARD] Published {len(remaining)} pages as {count} ranges of up to {RANGE_SIZE}.")
+
+    def _remove_ranges(self):
+        for name in os.listdir(self.base_dir):
+            if name.startswith("pages-"):
+                shutil.rmtree(os.path.join(self.base_dir, name))
+
+    def _cleanup(self):
+        # Worker metrics reports are kept; the queue and partial outputs are not.
+        self._remove_ranges()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.queue_path + suffix):
+                os.remove(self.queue_path + suffix)
+
+    def _start_workers(self):
+        # Spawned, not forked: each worker starts its own browser and event loop.
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(
+                target=run_worker,
+                args=(self.queue_path, self.headless, self.async_mode,
+                      self.persistent_browser, index, self.captcha_race, self.cache),
+            )
+            for index in range(self.shards)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return [worker.exitcode for worker in workers]
+
+    def _merge(self, queue):
+        # Page 1 is already in the exporter; ranges are merged in page order
+        # and deduplicated across workers by registration_id.
+        merged = 0
+        for start, end in queue.done_ranges():
+            path = os.path.join(range_dir(self.base_dir, start, end), f"{self.query}.json")
+            merged += self.exporter.load_records(path)
+        print(f"[SHARD] Merged {merged} records from {len(queue.done_ranges())} ranges.")
+
+    def run(self):
+        print(f"\n[SHARD] Starting sharded scrape for query: '{self.query}' "
+              f"with {self.shards} workers")
+        print(f"{'='*50}")
+
+        try:
+            remaining = self.scraper.prepare()
+        finally:
+            # Workers solve their own CAPTCHAs; the coordinator's browser is done.
+            self.scraper.sessions.close()
+        if remaining is None:
+            self.exporter.save()
+            return self.exporter.count
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        queue = ShardQueue(self.queue_path)
+        try:
+            self._publish(queue, remaining)
+            if queue.counts()["pending"]:
+                exit_codes = self._start_workers()
+                crashed = sum(1 for code in exit_codes if code != 0)
+                if crashed:
+                    print(f"[SHARD] {crashed} of {self.shards} workers exited with an error.")
+            self._merge(queue)
+            counts = queue.counts()
+        finally:
+            queue.close()
+
+        complete = counts["pending"] == 0 and counts["leased"] == 0
+        if not complete:
+            print(f"[SHARD] {counts['pending'] + counts['leased']} ranges missing; "
+                  f"re-run with --resume to fetch them.")
+        count = self.scraper.finish(complete=complete)
+        if complete:
+            self._cleanup()
+        METRICS.write_report(self.output_dir, self.query)
+        return count
@@ -0,0 +1,436 @@
+import io
+import os
+import csv
+import gzip
+import json
+import queue
+import hashlib
+import threading
+from array import array
+from columnar import DictionaryColumn, _require_pyarrow, arrow_schema
+
+COMPRESSIONS = ("gz", "zst")
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+BATCH_SIZE = 1000   # rows handed to each writer thread at a time
+ROW_GROUP_SIZE = 65536  # rows per Parquet row group / Arrow record batch when streaming
+QUEUE_DEPTH = 4     # batches buffered per writer before the reader waits
+
+
+def _require_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(
+            "zstd export requires zstandard — pip install zstandard"
+        ) from None
+    return zstandard
+
+
+def split_format(fmt):
+    # "csv.gz" -> ("csv", "gz"); "json" -> ("json", None)
+    base, _, compression = fmt.partition(".")
+    return base, compression or None
+
+
+def open_text(path, mode, compression=None, encoding="utf-8", newline=None):
+    if compression == "gz":
+        return gzip.open(path, mode + "t", compresslevel=GZIP_LEVEL,
+                         encoding=encoding, newline=newline)
+    if compression == "zst":
+        zstandard = _require_zstandard()
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
+    return open(path, mode, encoding=encoding, newline=newline)
+
+
+class RowDigest:
+    # Running record count and BLAKE2 checksum over normalized rows, fed by
+    # each writer as it writes. Every format hashes the same field values, so
+    # all files of one export share one digest.
+
+    def __init__(self):
+        self.records = 0
+        self._hash = hashlib.blake2b(digest_size=16)
+
+    def update(self, values):
+        row = "\x1f".join("" if v is None else str(v) for v in values)
+        self._hash.update(row.encode("utf-8"))
+        self._hash.update(b"\n")
+        self.records += 1
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class ExportWriter:
+    # One output format. Rows are tuples in field order. Everything is
+    # written to <path>.part and only moved into place by commit(), so a
+    # reader never sees a partial file.
+    compressible = True
+    checksummed = True
+    accepts_store = False
+    encoding = "utf-8"
+    newline = None
+
+    def __init__(self, path, fields, compression=None, headers=None, in_place=False,
+                 required=True, **options):
+        # in_place writes straight to the final path, for files meant to be
+        # read while they grow (the streaming NDJSON). A writer that is not
+        # required may fail without taking the other outputs with it.
+        self.path = path
+        self.required = required
+        self.part_path = path if in_place else path + ".part"
+        self.fields = list(fields)
+        self.headers = headers
+        self.compression = compression
+        self.digest = RowDigest()
+        self._file = None
+
+    @property
+    def records(self):
+        return self.digest.records
+
+    @property
+    def checksum(self):
+        return self.digest.hexdigest() if self.checksummed else None
+
+    def open(self):
+        self._file = open_text(self.part_path, "w", self.compression,
+                               encoding=self.encoding, newline=self.newline)
+        self.write_header()
+
+    def write_header(self):
+        pass
+
+    def write_footer(self):
+        pass
+
+    def write_row(self, row):
+        raise NotImplementedError
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+            self.digest.update(row)
+
+    def flush(self):
+        # Hands buffered rows to the OS so they survive the process dying.
+        # Compressed streams wait for sync(): flushing them per batch would
+        # end a compression block on every page.
+        if self.compression is None:
+            self._file.flush()
+
+    def sync(self):
+        self._file.flush()
+        if self.compression is None:
+            os.fsync(self._file.fileno())
+
+    def finish(self):
+        self.write_footer()
+        self._file.close()
+        self._file = None
+
+    def commit(self):
+        if self.part_path != self.path:
+            os.replace(self.part_path, self.path)
+
+    def discard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+class JsonWriter(ExportWriter):
+    # pretty=True matches json.dump(list, indent=2); otherwise one compact
+    # record per line.
+
+    def __init__(self, path, fields, compression=None, pretty=True, **options):
+        super().__init__(path, fields, compression, **options)
+        self.pretty = pretty
+        self._first = True
+
+    def write_header(self):
+        self._file.write("[")
+
+    def write_row(self, row):
+        record = dict(zip(self.fields, row))
+        if self.pretty:
+            text = json.dumps(record, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+        else:
+            text = json.dumps(record, ensure_ascii=False)
+        self._file.write("\n  " if self._first else ",\n  ")
+        self._file.write(text)
+        self._first = False
+
+    def write_footer(self):
+        if self.pretty:
+            self._file.write("]" if self._first else "\n]")
+        else:
+            self._file.write("]\n" if self._first else "\n]\n")
+
+
+class NdjsonWriter(ExportWriter):
+
+    def write_row(self, row):
+        self._file.write(json.dumps(dict(zip(self.fields, row)), ensure_ascii=False) + "\n")
+
+
+class CsvWriter(ExportWriter):
+    encoding = "utf-8-sig"
+    newline = ""
+
+    def write_header(self):
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.headers or self.fields)
+
+    def write_rows(self, rows):
+        digest = self.digest
+
+        def digested():
+            for row in rows:
+                digest.update(row)
+                yield row
+
+        self._writer.writerows(digested())
+
+
+class ColumnarWriter(ExportWriter):
+    # Parquet and Arrow IPC carry their own compression and are checked by
+    # row count only. A whole ColumnStore is written directly, keeping its
+    # dictionary encoding; streamed rows are buffered up to ROW_GROUP_SIZE so
+    # a page-sized batch does not become its own row group.
+    compressible = False
+    checksummed = False
+    accepts_store = True
+
+    def __init__(self, path, fields, compression=None, row_group_size=ROW_GROUP_SIZE,
+                 **options):
+        super().__init__(path, fields, compression, **options)
+        self.row_group_size = row_group_size
+        self._records = 0
+        self._buffer = []
+        _require_pyarrow()
+
+    @property
+    def records(self):
+        return self._records
+
+    def _new_writer(self, schema):
+        raise NotImplementedError
+
+    def open(self):
+        import pyarrow as pa
+        self._schema = arrow_schema(self.fields)
+        self._dictionaries = {
+            field.name: DictionaryColumn() for field in self._schema
+            if pa.types.is_dictionary(field.type)
+        }
+        self._file = None
+
+    def _write_table(self, table):
+        if self._file is None:
+            self._file = self._new_writer(table.schema)
+        self._file.write_table(table)
+        self._records += table.num_rows
+
+    def write_rows(self, rows):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        if not self._buffer:
+            return
+        columns = list(zip(*self._buffer))
+        self._buffer = []
+        self._write_table(pa.Table.from_arrays(
+            [self._encode(field, column) for field, column in zip(self.fields, columns)],
+            schema=self._schema,
+        ))
+
+    def _encode(self, field, column):
+        # Dictionary fields are encoded as in a buffered save's ColumnStore.
+        # Their dictionary only grows across chunks, so each chunk's extends
+        # the last one, which Arrow IPC files accept as a delta.
+        import pyarrow as pa
+        dictionary = self._dictionaries.get(field)
+        if dictionary is None:
+            return pa.array(column, type=pa.string())
+        for value in column:
+            dictionary.append(value)
+        encoded = dictionary.to_arrow()
+        dictionary.codes = array('I')
+        return encoded
+
+    def write_store(self, store):
+        self._write_table(store.to_arrow_table())
+
+    def flush(self):
+        # Buffered rows are only written as full row groups.
+        pass
+
+    def sync(self):
+        pass
+
+    def finish(self):
+        self._flush()
+        if self._file is None:
+            self._file = self._new_writer(self._schema)
+        self._file.close()
+        self._file = None
+
+    def discard(self):
+        self._buffer = []
+        super().discard()
+
+
+class ParquetWriter(ColumnarWriter):
+
+    def _new_writer(self, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.part_path, schema)
+
+
+class ArrowWriter(ColumnarWriter):
+
+    def _new_writer(self, schema):
+        import pyarrow as pa
+        return pa.ipc.new_file(self.part_path, schema,
+                               options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+
+WRITERS = {
+    "json": JsonWriter,
+    "ndjson": NdjsonWriter,
+    "csv": CsvWriter,
+    "parquet": ParquetWriter,
+    "arrow": ArrowWriter,
+}
+
+
+def register_writer(name, writer_class):
+    WRITERS[name] = writer_class
+
+
+def export_formats():
+    formats = []
+    for name, writer_class in WRITERS.items():
+        formats.append(name)
+        if writer_class.compressible:
+            formats.extend(f"{name}.{compression}" for compression in COMPRESSIONS)
+    return formats
+
+
+def make_writer(fmt, base_path, fields, **options):
+    base, compression = split_format(fmt)
+    writer_class = WRITERS.get(base)
+    if writer_class is None or (compression and (
+            compression not in COMPRESSIONS or not writer_class.compressible)):
+        raise ValueError(f"Unknown export format: {fmt}")
+    if compression == "zst":
+        _require_zstandard()
+    writer = writer_class(f"{base_path}.{fmt}", fields, compression, **options)
+    writer.format = fmt
+    return writer
+
+
+def write_parallel(writers, rows, store=None, batch_size=BATCH_SIZE):
+    # One pass over rows feeds every writer through its own bounded queue;
+    # each writer serializes (and compresses) in its own thread. If the rows
+    # or a required writer fail, nothing is committed. An optional writer
+    # that fails is discarded on its own, the others are committed, and the
+    # failures are returned as {writer: exception}.
+    failures = {}
+    reader_error = None
+    threads = []
+    queues = []
+
+    def consume(writer, batches):
+        failed = False
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if failed:
+                continue  # keep draining so the reader never blocks
+            try:
+                writer.write_rows(batch)
+            except Exception as e:
+                failures[writer] = e
+                failed = True
+        if not failed:
+            try:
+                writer.finish()
+            except Exception as e:
+                failures[writer] = e
+
+    def write_whole_store(writer):
+        try:
+            writer.write_store(store)
+            writer.finish()
+        except Exception as e:
+            failures[writer] = e
+
+    try:
+        for writer in writers:
+            try:
+                writer.open()
+            except Exception as e:
+                if writer.required:
+                    raise
+                failures[writer] = e
+    except BaseException:
+        for writer in writers:
+            writer.discard()
+        raise
+
+    for writer in writers:
+        if writer in failures:
+            continue
+        if store is not None and writer.accepts_store:
+            thread = threading.Thread(target=write_whole_store, args=(writer,))
+        else:
+            batches = queue.Queue(maxsize=QUEUE_DEPTH)
+            queues.append(batches)
+            thread = threading.Thread(target=consume, args=(writer, batches))
+        thread.start()
+        threads.append(thread)
+
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                for batches in queues:
+                    batches.put(batch)
+                batch = []
+        if batch:
+            for batches in queues:
+                batches.put(batch)
+    except BaseException as e:
+        reader_error = e
+    finally:
+        for batches in queues:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+
+    required_errors = [e for writer, e in failures.items() if writer.required]
+    if reader_error is not None or required_errors:
+        for writer in writers:
+            writer.discard()
+        raise reader_error if reader_error is not None else required_errors[0]
+    for writer in writers:
+        if writer in failures:
+            writer.discard()
+        else:
+            writer.commit()
+    return failures
@@ -0,0 +1,78 @@
+import os
+import json
+import time
+
+# Normalized record fields an incremental scan can follow.
+ORDER_FIELDS = ("registration_id", "filing_date")
+
+
+def _is_sorted(values, direction):
+    if direction == "asc":
+        return all(a <= b for a, b in zip(values, values[1:]))
+    return all(a >= b for a, b in zip(values, values[1:]))
+
+
+def detect_ordering(records):
+    # Returns e.g. "registration_id:asc", or None if the page is not sorted
+    # by any key an incremental scan can rely on.
+    for field in ORDER_FIELDS:
+        values = [r.get(field) for r in records]
+        if len(values) < 2 or any(not v for v in values):
+            continue
+        for direction in ("asc", "desc"):
+            if _is_sorted(values, direction):
+                return f"{field}:{direction}"
+    return None
+
+
+def page_is_ordered(records, ordering, edge=None):
+    # Checks a probed page still follows the ordering, including across the
+    # boundary with the page probed before it. Descending orders are scanned
+    # forwards (edge comes before this page), ascending ones backwards (edge
+    # comes after it).
+    field, direction = ordering.split(":")
+    values = [r.get(field) for r in records]
+    if any(not v for v in values):
+        return False
+    if edge is not None and values:
+        values = values + [edge] if direction == "asc" else [edge] + values
+    return _is_sorted(values, direction)
+
+
+class IncrementalState:
+
+    def __init__(self, query, output_dir="output"):
+        self.path = os.path.join(output_dir, f"{query}.state.json")
+        self.high_water = {field: None for field in ORDER_FIELDS}
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        for field, value in state.get("high_water", {}).items():
+            self.observe_value(field, value)
+        return state
+
+    def observe_value(self, field, value):
+        if value and (self.high_water[field] is None or value > self.high_water[field]):
+            self.high_water[field] = value
+
+    def observe(self, records):
+        for field in ORDER_FIELDS:
+            for record in records:
+                self.observe_value(field, record.get(field))
+
+    def save(self, ordering, total_results, total_pages):
+        state = {
+            "ordering": ordering,
+            "high_water": self.high_water,
+            "total_results": total_results,
+            "total_pages": total_pages,
+            "updated_at": time.time(),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
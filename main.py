@@ -1,32 +1,109 @@
 import sys
+import argparse
 from BusinessSearchScraper import BusinessSearchScraper
+from batch_runner import BatchRunner, read_queries
+from distributed import ShardCoordinator, run_worker
+from data_exporter import verify_export
+from export_writers import export_formats
 
 DEFAULT_QUERY = "tech"
 
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Data Scraping Engineer — Trial Test")
+    parser.add_argument("query", nargs="?", default=DEFAULT_QUERY)
+    parser.add_argument("--no-headless", action="store_true",
+                        help="show the browser while solving the CAPTCHA")
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="fetch pages with the asyncio HTTP engine")
+    parser.add_argument("--stream", action="store_true",
+                        help="append each page to disk as it arrives")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the page journal of a previous run")
+    parser.add_argument("--persistent-browser", action="store_true",
+                        help="keep one browser profile warm across CAPTCHA solves")
+    parser.add_argument("--captcha-race", type=int, default=0, metavar="N",
+                        help="solve each CAPTCHA in N warm browser processes at once and keep the "
+                             "first token (capped at 4)")
+    parser.add_argument("--format", dest="formats", action="append", default=[],
+                        choices=export_formats(), metavar="FORMAT",
+                        help="also write FORMAT: parquet, arrow, ndjson, or json/csv/ndjson "
+                             "with .gz or .zst (repeatable)")
+    parser.add_argument("--delta", action="store_true",
+                        help="export only records that are new or changed since earlier runs")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch pages past the previous run's high-water mark")
+    parser.add_argument("--cache", action="store_true",
+                        help="serve repeated page requests from an on-disk response cache")
+    parser.add_argument("--fresh-session", action="store_true",
+                        help="solve a new CAPTCHA instead of reusing a stored session")
+    parser.add_argument("--verify", action="store_true",
+                        help="re-check existing output files against their manifests and exit")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="read one query per line from FILE ('-' for stdin)")
+    parser.add_argument("--shards", type=int, default=0, metavar="N",
+                        help="split the pages across N worker processes, each with its own session")
+    parser.add_argument("--shard-worker", metavar="QUEUE",
+                        help="join a sharded scrape by leasing ranges from QUEUE "
+                             "(e.g. output/shards/<query>/queue.sqlite; same host only)")
+    args = parser.parse_args(argv)
+    if args.captcha_race > 1 and args.persistent_browser:
+        parser.error("--captcha-race racers already keep warm browsers; "
+                     "drop --persistent-browser")
+    return args
+
+
 def main():
-    query = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_QUERY
-    headless = "--no-headless" not in sys.argv
+    args = parse_args(sys.argv[1:])
+    headless = not args.no_headless
+    if args.shard_worker:
+        run_worker(args.shard_worker, headless=headless, async_mode=args.async_mode,
+                   persistent_browser=args.persistent_browser, captcha_race=args.captcha_race,
+                   cache=args.cache)
+        sys.exit(0)
+    queries = read_queries(args.batch) if args.batch else [args.query]
+    if args.verify:
+        results = [verify_export(query) for query in queries]
+        sys.exit(0 if all(results) else 1)
 
     print(f"Data Scraping Engineer — Trial Test")
-    print(f"Query: '{query}' | Headless: {headless}")
+    print(f"Queries: {', '.join(repr(q) for q in queries)} | Headless: {headless} | "
+          f"Async: {args.async_mode} | Streaming: {args.stream} | Resume: {args.resume}")
     print()
 
-    scraper = BusinessSearchScraper(query, headless=headless)
+    options = dict(headless=headless, async_mode=args.async_mode,
+                   streaming=args.stream, resume=args.resume,
+                   persistent_browser=args.persistent_browser, formats=args.formats,
+                   delta=args.delta, incremental=args.incremental,
+                   captcha_race=args.captcha_race, cache=args.cache,
+                   reuse_session=not args.fresh_session)
+    if args.batch:
+        runner = BatchRunner(queries, **options)
+        # Only the current wave's exporters hold unsaved records.
+        exporters = lambda: [scraper.exporter for scraper in runner.active_scrapers]
+    elif args.shards:
+        runner = ShardCoordinator(queries[0], args.shards, **options)
+        exporters = lambda: [runner.exporter]
+    else:
+        runner = BusinessSearchScraper(queries[0], **options)
+        exporters = lambda: [runner.exporter]
 
     try:
-        count = scraper.run()
+        result = runner.run()
+        count = sum(result.values()) if args.batch else result
         print(f"Done. {count} records scraped.")
         sys.exit(0)
     except KeyboardInterrupt:
         print("\nInterrupted. Saving partial results...")
-        scraper.exporter.save()
+        for exporter in exporters():
+            exporter.save()
         sys.exit(0)
     except Exception as e:
         print(f"\nFatal error: {e}")
-        if scraper.exporter.results:
-            print("Saving partial results before exit...")
-            scraper.exporter.save()
+        for exporter in exporters():
+            if exporter.count:
+                print(f"Saving partial results for '{exporter.query}' before exit...")
+                exporter.save()
         sys.exit(1)
 
 
@@ -0,0 +1,162 @@
+import os
+import csv
+import json
+import time
+from export_writers import RowDigest, open_text, split_format
+
+MANIFEST_VERSION = 1
+READ_CHUNK = 1 << 16
+
+
+def manifest_path(output_dir, query):
+    return os.path.join(output_dir, f"{query}.manifest.json")
+
+
+def write_manifest(path, query, fields, entries):
+    # entries: {format: {"path": ..., "records": ..., "blake2b": ...}}
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "query": query,
+        "fields": list(fields),
+        "created_at": time.time(),
+        "files": {},
+    }
+    for fmt, entry in entries.items():
+        manifest["files"][fmt] = dict(
+            entry,
+            path=os.path.basename(entry["path"]),
+            bytes=os.path.getsize(entry["path"]),
+        )
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def load_manifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_json_array(path, compression=None):
+    # Yields the objects of a top-level JSON array while holding at most one
+    # object and one read chunk in memory.
+    decoder = json.JSONDecoder()
+    with open_text(path, 'r', compression) as f:
+        buffer = ""
+        started = False
+        eof = False
+        while True:
+            stripped = buffer.lstrip()
+            if not started:
+                if stripped.startswith("["):
+                    buffer = stripped[1:]
+                    started = True
+                    continue
+                if stripped:
+                    raise ValueError(f"{path} does not contain a JSON array")
+            elif stripped.startswith(","):
+                buffer = stripped[1:]
+                continue
+            elif stripped.startswith("]"):
+                return
+            elif stripped:
+                try:
+                    obj, end = decoder.raw_decode(stripped)
+                except ValueError:
+                    if eof:
+                        raise
+                else:
+                    yield obj
+                    buffer = stripped[end:]
+                    continue
+            if eof:
+                raise ValueError(f"Unexpected end of JSON array in {path}")
+            chunk = f.read(READ_CHUNK)
+            eof = not chunk
+            buffer = stripped + chunk
+
+
+def _digest_json(path, fields, compression=None):
+    digest = RowDigest()
+    for record in iter_json_array(path, compression):
+        digest.update(record.get(f) for f in fields)
+    return digest
+
+
+def _digest_ndjson(path, fields, compression=None):
+    digest = RowDigest()
+    with open_text(path, 'r', compression) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                digest.update(record.get(f) for f in fields)
+    return digest
+
+
+def _digest_csv(path, fields, headers, compression=None):
+    digest = RowDigest()
+    with open_text(path, 'r', compression, encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if headers is not None and header != headers:
+            raise ValueError(f"CSV header mismatch: expected {headers}, got {header}")
+        for row in reader:
+            digest.update(row)
+    return digest
+
+
+def _count_columnar(path, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def verify_files(path, csv_headers=None):
+    # After-the-fact check: re-reads every file listed in the manifest in
+    # constant memory and compares counts and checksums. Returns a list of
+    # error strings (empty when everything matches).
+    manifest = load_manifest(path)
+    fields = manifest["fields"]
+    base_dir = os.path.dirname(path)
+    errors = []
+    for fmt, entry in manifest["files"].items():
+        file_path = os.path.join(base_dir, entry["path"])
+        base, compression = split_format(fmt)
+        try:
+            if base in ("parquet", "arrow"):
+                records = _count_columnar(file_path, base)
+                digest = None
+            else:
+                if base == "json":
+                    found = _digest_json(file_path, fields, compression)
+                elif base == "ndjson":
+                    found = _digest_ndjson(file_path, fields, compression)
+                elif base == "csv":
+                    found = _digest_csv(file_path, fields, csv_headers, compression)
+                else:
+                    # Formats added through register_writer() are checked by
+                    # size only; their readers are not known here.
+                    found = None
+                if found is None:
+                    if os.path.getsize(file_path) != entry["bytes"]:
+                        errors.append(f"{fmt.upper()} size mismatch")
+                    continue
+                records, digest = found.records, found.hexdigest()
+        except Exception as e:
+            errors.append(f"{fmt.upper()} could not be read: {e}")
+            continue
+
+        if records != entry["records"]:
+            errors.append(f"{fmt.upper()} record count mismatch: "
+                          f"file={records}, manifest={entry['records']}")
+        if digest is not None and digest != entry.get("blake2b"):
+            errors.append(f"{fmt.upper()} checksum mismatch: "
+                          f"file={digest}, manifest={entry.get('blake2b')}")
+    return errors
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (list(extra) if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{value}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+class _Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        labels = _format_labels(key, [("le", bound)])
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(key, [("le", "+Inf")])
+                    lines.append(f"{name}_bucket{labels} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        with self._lock:
+            counters = {
+                name: {_format_labels(key) or "total": value for key, value in series.items()}
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: {_format_labels(key) or "all": h.to_dict() for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+        return {
+            "started_at": self.started_at,
+            "elapsed_seconds": round(time.time() - self.started_at, 3),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def write_report(self, output_dir, name):
+        os.makedirs(output_dir, exist_ok=True)
+        json_path = os.path.join(output_dir, f"{name}.metrics.json")
+        prom_path = os.path.join(output_dir, f"{name}.metrics.prom")
+
+        tmp_path = json_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, json_path)
+
+        tmp_path = prom_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, prom_path)
+
+        print(f"[METRICS] Run report saved: {json_path}")
+        return json_path, prom_path
+
+
+METRICS = MetricsRegistry()
+
+METRICS.describe("api_requests_total", "HTTP responses from /api/search by status code.")
+METRICS.describe("api_request_seconds", "Latency of a single /api/search request.")
+METRICS.describe("api_retries_total", "Request attempts that were retried, by reason.")
+METRICS.describe("api_cache_total", "Response cache lookups: hit, revalidated (304) or miss.")
+METRICS.describe("rate_limiter_wait_seconds", "Time a request spent waiting for a rate limiter token.")
+METRICS.describe("captcha_solves_total", "CAPTCHA solve outcomes.")
+METRICS.describe("captcha_solve_seconds", "Wall time of a full CAPTCHA solve.")
+METRICS.describe("captcha_transcribe_seconds", "Time spent decoding and transcribing one audio challenge.")
+METRICS.describe("captcha_transcribe_confidence", "Probability of the best transcription hypothesis.")
+METRICS.describe("session_renewals_total", "Session renewals, by where the new session came from.")
+METRICS.describe("scheduler_reorder_depth", "Finished pages held in the reorder buffer after each wait.")
+METRICS.describe("exporter_records_total", "Records passed to the exporter, by outcome.")
+METRICS.describe("exporter_lock_wait_seconds", "Time add_records waited for the exporter lock.")
+METRICS.describe("exporter_lock_hold_seconds", "Time add_records held the exporter lock.")
+METRICS.describe("exporter_save_seconds", "Time spent in DataExporter.save().")
@@ -0,0 +1,77 @@
+import os
+import json
+import sqlite3
+import threading
+
+
+class PageJournal:
+
+    def __init__(self, query, output_dir="output"):
+        self.query = query
+        self.path = os.path.join(output_dir, f"{query}.journal.sqlite")
+        self._lock = threading.Lock()
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        # Each page's normalized records are kept so DataExporter state
+        # (records and seen_ids) can be rebuilt by replaying pages in order.
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS page_records (page INTEGER PRIMARY KEY, records TEXT)"
+        )
+        self._conn.commit()
+
+    @property
+    def total_pages(self):
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'totalPages'"
+        ).fetchone()
+        return int(row[0]) if row else None
+
+    @total_pages.setter
+    def total_pages(self, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('totalPages', ?)",
+                (str(value),),
+            )
+            self._conn.commit()
+
+    def record_page(self, page, records):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO page_records (page, records) VALUES (?, ?)",
+                (page, json.dumps(records, ensure_ascii=False)),
+            )
+            self._conn.commit()
+
+    def completed_pages(self):
+        return {row[0] for row in self._conn.execute("SELECT page FROM page_records")}
+
+    def iter_pages(self):
+        cursor = self._conn.execute("SELECT page, records FROM page_records ORDER BY page")
+        for page, records in cursor:
+            yield page, json.loads(records)
+
+    def reset(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM meta")
+            self._conn.execute("DELETE FROM page_records")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def remove(self):
+        with self._lock:
+            self._conn.close()
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except OSError:
+                    pass
@@ -0,0 +1,164 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from captcha_solver import CaptchaSolverError
+from api_client import AsyncExecutor, SessionExpiredError
+from data_exporter import normalize_results
+from metrics import METRICS
+
+MAX_REAUTH_ATTEMPTS = 3  # consecutive renewals without a successful page
+WORKERS = 3
+RAMP_UP_AFTER = 10       # successful pages before another worker is added
+WINDOW = 32              # pages in flight or waiting for an earlier page
+REORDER_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class PageSource:
+    # Owner of PageScheduler jobs: fetches pages of self.query with self.api
+    # and stores them in _collect(). Workers normalize their own page, so
+    # the thread collecting pages in order only dedups and stores records.
+
+    def _fetch_and_collect(self, page):
+        data = self.api.fetch_page(self.query, page)
+        return page, normalize_results(data.get('results', []))
+
+    async def _fetch_and_collect_async(self, page):
+        data = await self.api.fetch_page_async(self.query, page)
+        return page, normalize_results(data.get('results', []))
+
+
+class PageScheduler:
+    # Fetches (scraper, page) jobs from a shared work queue, so pages from any
+    # number of queries share the same session, workers and re-auth handling.
+    # On the first 403 dispatch stops, the session is renewed, and the pages
+    # that were in flight on the dead session go back on the queue.
+    #
+    # Finished pages wait in a reorder buffer and are collected in job order
+    # as soon as every earlier job has finished. Only jobs within `window` of
+    # the oldest unfinished one are dispatched, so a slow page holds back
+    # dispatch instead of letting the buffer grow.
+
+    def __init__(self, api, sessions, async_mode=False, window=WINDOW):
+        self.api = api
+        self.sessions = sessions
+        self.async_mode = async_mode
+        self.max_workers = api.max_concurrency if async_mode else WORKERS
+        self.window = max(window, self.max_workers)
+
+    def _make_pool(self, workers):
+        if self.async_mode:
+            return AsyncExecutor(self.api, max_workers=workers)
+        return ThreadPoolExecutor(max_workers=workers)
+
+    def _submit(self, pool, scraper, page):
+        if self.async_mode:
+            return pool.submit(scraper._fetch_and_collect_async, page)
+        return pool.submit(scraper._fetch_and_collect, page)
+
+    def _emit(self, jobs, ready, cursor):
+        # Collects the contiguous run of finished jobs starting at cursor.
+        # Failed jobs are stored as None and only advance the cursor.
+        while cursor in ready:
+            results = ready.pop(cursor)
+            if results is not None:
+                scraper, page = jobs[cursor]
+                scraper._collect(page, results)
+            cursor += 1
+        return cursor
+
+    def _abandon(self, jobs, pending, ready, failed):
+        # Undispatched jobs are given up on, so the pages still in flight can
+        # be collected without waiting for them. Pages that expire after
+        # this are failed rather than requeued.
+        for index in pending:
+            failed.append(jobs[index])
+            ready[index] = None
+        pending.clear()
+
+    def run(self, jobs):
+        jobs = list(jobs)
+        self.sessions.expect_pages(len(jobs))
+        pending = deque(range(len(jobs)))
+        in_flight = {}
+        ready = {}
+        cursor = 0
+        failed = []
+        workers = self.max_workers
+        streak = 0
+        reauth_count = 0
+        abandoned = False
+
+        with self._make_pool(self.max_workers) as pool:
+            while pending or in_flight:
+                while (pending and len(in_flight) < workers
+                       and pending[0] < cursor + self.window):
+                    index = pending.popleft()
+                    in_flight[self._submit(pool, *jobs[index])] = index
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                expired = None
+                for future in done:
+                    index = in_flight.pop(future)
+                    try:
+                        _, results = future.result()
+                    except SessionExpiredError as e:
+                        if not abandoned:
+                            pending.appendleft(index)
+                            expired = e
+                            continue
+                        failed.append(jobs[index])
+                        ready[index] = None
+                        continue
+                    except Exception as e:
+                        scraper, page = jobs[index]
+                        print(f"[SCRAPER] Error on '{scraper.query}' page {page}: {e}")
+                        failed.append(jobs[index])
+                        ready[index] = None
+                        continue
+
+                    ready[index] = results
+                    reauth_count = 0
+                    streak += 1
+                    if streak >= RAMP_UP_AFTER and workers < self.max_workers:
+                        workers += 1
+                        streak = 0
+                        print(f"[SCRAPER] Increasing workers to {workers}.")
+
+                METRICS.observe("scheduler_reorder_depth", len(ready), buckets=REORDER_BUCKETS)
+                cursor = self._emit(jobs, ready, cursor)
+
+                # Pages failing on an already-replaced session are just requeued.
+                if expired is None or expired.session_id != self.api.session_id:
+                    continue
+
+                if expired.session_id is None:
+                    # First page the response cache could not serve.
+                    try:
+                        self.sessions.renew(None)
+                    except CaptchaSolverError as e:
+                        print(f"[SCRAPER] Authentication failed: {e}")
+                        self._abandon(jobs, pending, ready, failed)
+                        abandoned = True
+                    continue
+
+                reauth_count += 1
+                if reauth_count > MAX_REAUTH_ATTEMPTS:
+                    print("[SCRAPER] Max re-authentication attempts reached. Saving partial data.")
+                    self._abandon(jobs, pending, ready, failed)
+                    abandoned = True
+                    continue
+
+                workers = max(1, workers - 1)
+                streak = 0
+                print(f"[SCRAPER] Session expired. Re-authenticating ({reauth_count}/{MAX_REAUTH_ATTEMPTS})... "
+                      f"Reducing workers to {workers}.")
+                try:
+                    self.sessions.renew(expired.session_id)
+                except CaptchaSolverError as e:
+                    print(f"[SCRAPER] Re-authentication failed: {e}")
+                    self._abandon(jobs, pending, ready, failed)
+                    abandoned = True
+
+            self._emit(jobs, ready, cursor)
+
+        return failed
+
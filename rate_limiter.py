@@ -0,0 +1,77 @@
+import time
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+TARGET_RATE = 2.0        # requests per second at start-up
+MIN_RATE = 0.2
+MAX_RATE = 20.0
+INCREASE_STEP = 0.1      # additive increase per accepted request
+DECREASE_FACTOR = 0.5    # multiplicative decrease per back-off
+DECREASE_COOLDOWN = 1.0  # seconds; one burst of errors only halves the rate once
+BURST = 1
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+
+    def __init__(self, rate=TARGET_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE,
+                 burst=BURST):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        # Take a token now and return how long the caller must wait for it.
+        # Tokens may go negative, which queues callers behind each other.
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return max(0.0, wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return max(0.0, wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + INCREASE_STEP)
+
+    def on_backoff(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_COOLDOWN:
+                self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+                self._last_decrease = now
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
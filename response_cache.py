@@ -0,0 +1,114 @@
+import os
+import time
+import zlib
+import sqlite3
+import threading
+from collections import namedtuple
+
+CACHE_NAME = "response_cache.sqlite"
+CACHE_TTL = 3600                  # seconds a response is served without asking the server
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # compressed bodies kept before LRU eviction
+COMPRESSION_LEVEL = 6
+
+CachedResponse = namedtuple("CachedResponse", "body etag last_modified fresh")
+
+
+class ResponseCache:
+    # zlib-compressed /api/search bodies keyed by URL, query and page. Fresh
+    # entries are served without a request; stale ones are revalidated with
+    # their ETag / Last-Modified when the server sent one.
+
+    def __init__(self, path, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " body BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " stored_at REAL,"
+            " last_used REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    @staticmethod
+    def key(url, query, page):
+        return f"{url}?q={query}&page={page}"
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        body, etag, last_modified, stored_at = row
+        return CachedResponse(
+            zlib.decompress(body), etag, last_modified, now - stored_at < self.ttl
+        )
+
+    def put(self, key, body, etag=None, last_modified=None):
+        compressed = zlib.compress(body, COMPRESSION_LEVEL)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, body, size, etag, last_modified, stored_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, compressed, len(compressed), etag, last_modified, now, now),
+            )
+            self._size += len(compressed) - (row[0] if row else 0)
+            self._evict()
+            self._conn.commit()
+
+    def refresh(self, key):
+        # A 304 restarts the entry's TTL without rewriting its body.
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ?, last_used = ? WHERE key = ?",
+                (now, now, key),
+            )
+            self._conn.commit()
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_used LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for key, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= size
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
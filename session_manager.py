@@ -0,0 +1,113 @@
+import queue
+import threading
+from api_client import AUTH_QUERY
+from metrics import METRICS
+
+SPARE_SESSIONS = 1
+SPARE_WAIT_TIMEOUT = 120
+PREFILL_PAGES = 50  # pages in one dispatch before a spare is solved up front
+
+
+class SessionManager:
+    # Keeps spare sessions solved in a background thread so a 403 can be
+    # answered by swapping sessions instead of stalling every worker on a
+    # browser launch and audio solve.
+
+    def __init__(self, solver, api, spares=SPARE_SESSIONS, prefill_pages=PREFILL_PAGES):
+        # A dispatch of at least prefill_pages pages starts solving a spare
+        # at once, so its first 403 can be answered by a swap. Shorter runs,
+        # which rarely outlive a session, solve one only after the first
+        # renewal. prefill_pages=None always waits for the renewal.
+        self.solver = solver
+        self.api = api
+        self.spares = spares
+        self.prefill_pages = prefill_pages
+        self._spare = queue.Queue()
+        self._lock = threading.Lock()
+        self._renew_lock = threading.Lock()
+        self._refill_thread = None
+        self._closed = False
+
+    def authenticate(self, query=AUTH_QUERY):
+        # A stored session skips the solve entirely, and prepares no spares.
+        data = self.api.restore_session(query)
+        if data is not None:
+            METRICS.inc("session_renewals_total", source="stored")
+            return data
+
+        token = self.solver.solve()
+        return self.api.authenticate(token, query)
+
+    def expect_pages(self, count):
+        # Called as a run starts dispatching count pages.
+        if self.prefill_pages is not None and count >= self.prefill_pages:
+            self._start_refill()
+
+    def _start_refill(self):
+        with self._lock:
+            if self._closed or self.spares <= 0:
+                return
+            if self._refill_thread and self._refill_thread.is_alive():
+                return
+            self._refill_thread = threading.Thread(target=self._refill, daemon=True)
+            self._refill_thread.start()
+
+    def _refilling(self):
+        return self._refill_thread is not None and self._refill_thread.is_alive()
+
+    def _refill(self):
+        while not self._closed and self._spare.qsize() < self.spares:
+            try:
+                token = self.solver.solve()
+                session, _ = self.api.create_session(token)
+            except Exception as e:
+                print(f"[SESSION] Background solve failed: {e}")
+                return
+            self._spare.put(session)
+            print(f"[SESSION] Spare session ready ({self._spare.qsize()}/{self.spares}).")
+
+    def renew(self, expired_session):
+        # Called by whichever worker hits the 403 first; later callers holding
+        # the same dead session find it already replaced and return at once.
+        with self._renew_lock:
+            if self.api.session_id != expired_session:
+                return
+            if expired_session is None:
+                # Every page so far came from the response cache; this is
+                # the run's first authentication, not a renewal.
+                self.authenticate()
+                return
+
+            try:
+                session = self._spare.get_nowait()
+            except queue.Empty:
+                session = None
+
+            if session is None and self._refilling():
+                # Waiting less than the solve's own deadline would start a
+                # second solve alongside it.
+                print("[SESSION] Waiting for background solve to finish...")
+                try:
+                    session = self._spare.get(
+                        timeout=max(SPARE_WAIT_TIMEOUT, self.solver.max_solve_seconds)
+                    )
+                except queue.Empty:
+                    session = None
+
+            if session is not None:
+                print("[SESSION] Swapping in spare session.")
+                METRICS.inc("session_renewals_total", source="spare")
+                self.api.use_session(session)
+            else:
+                print("[SESSION] No spare session available. Re-authenticating...")
+                METRICS.inc("session_renewals_total", source="blocking")
+                token = self.solver.solve()
+                self.api.authenticate(token)
+
+        self._start_refill()
+
+    def close(self):
+        # The solver cancels a background solve still in progress rather
+        # than letting shutdown wait for it.
+        self._closed = True
+        self.solver.close()
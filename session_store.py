@@ -0,0 +1,71 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes stay atomic, but are not serialized
+    fcntl = None
+
+# Live session tokens stay out of the output directory, whose exports get
+# uploaded and shared.
+STATE_DIR = "state"
+SESSION_STORE_NAME = "sessions.json"
+SESSION_MAX_AGE = 1800  # seconds a stored session is worth probing
+
+
+class SessionStore:
+    # Search sessions shared between runs, keyed by base URL. Every access
+    # holds an exclusive lock on a sidecar file, so concurrent cron runs see
+    # a consistent store.
+
+    def __init__(self, path, max_age=SESSION_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, sessions):
+        tmp_path = self.path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump(sessions, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def load(self, base_url):
+        with self._locked():
+            entry = self._read().get(base_url)
+        if entry and time.time() - entry.get("saved_at", 0) < self.max_age:
+            return entry.get("session")
+        return None
+
+    def save(self, base_url, session_id):
+        with self._locked():
+            sessions = self._read()
+            sessions[base_url] = {"session": session_id, "saved_at": time.time()}
+            self._write(sessions)
+
+    def discard(self, base_url, session_id):
+        with self._locked():
+            sessions = self._read()
+            if sessions.get(base_url, {}).get("session") == session_id:
+                del sessions[base_url]
+                self._write(sessions)
@@ -0,0 +1,38 @@
+import threading
+from captcha_solver import CaptchaSolver, RACE_STARTUP
+
+
+def test_racing_solves_run_one_at_a_time():
+    solver = CaptchaSolver(race=2)
+    running = []
+    overlaps = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def fake_race():
+        running.append(1)
+        overlaps.append(len(running))
+        entered.set()
+        release.wait(5)
+        running.pop()
+        return f"token-{len(overlaps)}"
+
+    solver._solve_race = fake_race
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(solver.solve())) for _ in range(2)]
+    threads[0].start()
+    assert entered.wait(5)
+    threads[1].start()
+    # Without the lock the second solve would enter the race by now.
+    threads[1].join(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert overlaps == [1, 1]
+    assert sorted(results) == ["token-1", "token-2"]
+
+
+def test_max_solve_seconds_covers_the_race_startup():
+    assert CaptchaSolver(timeout=100).max_solve_seconds == 100
+    assert CaptchaSolver(timeout=100, race=3).max_solve_seconds == 100 + RACE_STARTUP
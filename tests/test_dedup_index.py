@@ -0,0 +1,132 @@
+import json
+import pytest
+from dedup_index import DedupIndex, DEDUP_INDEX_NAME
+from data_exporter import DataExporter, normalize_results
+from BusinessSearchScraper import BusinessSearchScraper
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / DEDUP_INDEX_NAME)
+
+
+def reopen(index, path):
+    # A new process sees only what was committed.
+    index.close()
+    return DedupIndex(path)
+
+
+def test_claim_outcomes(index_path):
+    index = DedupIndex(index_path)
+    assert index.claim("q", [("SD01", "a"), ("SD02", "b")]) == ["new", "new"]
+    assert index.commit("q") == 2
+
+    outcomes = index.claim("q", [("SD01", "a"), ("SD02", "c"), ("SD03", "d")])
+
+    assert outcomes == ["unchanged", "changed", "new"]
+    index.close()
+
+
+def test_committed_hashes_persist(index_path):
+    index = DedupIndex(index_path)
+    index.claim("q", [("SD01", "a")])
+    index.commit("q")
+    index = reopen(index, index_path)
+
+    assert index.claim("other", [("SD01", "a"), ("SD01", "b")]) == ["unchanged", "changed"]
+    index.close()
+
+
+def test_pending_claims_are_seen_by_other_queries(index_path):
+    # Two queries returning the same record in one run export it once.
+    index = DedupIndex(index_path)
+    assert index.claim("q1", [("SD01", "a")]) == ["new"]
+    assert index.claim("q2", [("SD01", "a")]) == ["unchanged"]
+    assert index.commit("q2") == 0
+    assert index.commit("q1") == 1
+    index.close()
+
+
+def test_uncommitted_claims_are_not_stored(index_path):
+    index = DedupIndex(index_path)
+    index.claim("q", [("SD01", "a")])
+    index.claim("q", [("SD02", "b")])
+    index.commit("other")
+    index = reopen(index, index_path)
+
+    assert index.claim("q", [("SD01", "a"), ("SD02", "b")]) == ["new", "new"]
+    index.close()
+
+
+def test_commit_delta(tmp_path, index_path):
+    records = normalize_results([
+        {"businessName": "changed", "registrationId": "SD01"},
+        {"businessName": "new", "registrationId": "SD02"},
+    ])
+    index = DedupIndex(index_path)
+    index.claim("q", [("SD01", "stale")])
+    index.commit("q")
+    exporter = DataExporter("q", output_dir=str(tmp_path), dedup_index=index)
+
+    assert exporter.add_records(records) == 2
+    assert exporter.delta_counts == {"new": 1, "changed": 1, "unchanged": 0}
+
+    exporter.commit_delta()
+    index = reopen(index, index_path)
+    exporter = DataExporter("q", output_dir=str(tmp_path), dedup_index=index)
+
+    assert exporter.add_records(records) == 0
+    assert exporter.delta_counts == {"new": 0, "changed": 0, "unchanged": 2}
+    index.close()
+
+
+class FakeSessions:
+
+    def expect_pages(self, count):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeAPI:
+    # Serves 4 pages of 10 records; pages in `failing` raise.
+    max_concurrency = 3
+    cache = None
+    session_id = "session"
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def fetch_page(self, query, page):
+        if page in self.failing:
+            raise RuntimeError(f"page {page} unavailable")
+        results = [
+            {"businessName": f"Business {i}", "registrationId": f"SD{i:04d}",
+             "status": "Active", "filingDate": "", "agent": {}}
+            for i in range((page - 1) * 10 + 1, page * 10 + 1)
+        ]
+        return {"results": results, "totalPages": 4, "totalResults": 40}
+
+
+def scrape(tmp_path, api, resume):
+    index = DedupIndex(str(tmp_path / DEDUP_INDEX_NAME))
+    scraper = BusinessSearchScraper("q", api=api, sessions=FakeSessions(), solver=object(),
+                                    output_dir=str(tmp_path), delta=True, dedup_index=index,
+                                    resume=resume, reuse_session=False)
+    scraper.run()
+    index.close()
+    with open(tmp_path / "q.json", encoding="utf-8") as f:
+        return sorted(r["registration_id"] for r in json.load(f))
+
+
+def test_resumed_delta_run_keeps_journal_records(tmp_path):
+    partial = scrape(tmp_path, FakeAPI(failing={3}), resume=False)
+    assert len(partial) == 30
+
+    # Pages 1, 2 and 4 come back from the journal and are claimed again;
+    # had the partial run committed them, they would be dropped as unchanged.
+    resumed = scrape(tmp_path, FakeAPI(), resume=True)
+
+    assert resumed == [f"SD{i:04d}" for i in range(1, 41)]
+    assert scrape(tmp_path, FakeAPI(), resume=False) == []
@@ -0,0 +1,89 @@
+import pytest
+import distributed
+from distributed import ShardQueue, split_ranges
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(distributed, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def shard_queue(tmp_path):
+    shard_queue = ShardQueue(str(tmp_path / "queue.sqlite"))
+    yield shard_queue
+    shard_queue.close()
+
+
+def test_split_ranges():
+    assert split_ranges([2, 3, 4, 5, 7, 8], size=3) == [(2, 4), (5, 5), (7, 8)]
+
+
+def test_live_lease_is_not_handed_out_twice(shard_queue, clock):
+    shard_queue.publish("llc", [2, 3])
+    assert shard_queue.lease("a") is not None
+
+    clock.now += distributed.LEASE_TIMEOUT - 1
+    assert shard_queue.lease("b") is None
+
+
+def test_renewed_lease_does_not_expire(shard_queue, clock):
+    shard_queue.publish("llc", [2, 3])
+    range_id, _, _ = shard_queue.lease("a")
+
+    clock.now += distributed.LEASE_TIMEOUT - 1
+    assert shard_queue.renew(range_id, "a")
+    clock.now += distributed.LEASE_TIMEOUT - 1
+    assert shard_queue.lease("b") is None
+
+
+def test_expired_lease_is_leased_again(shard_queue, clock):
+    shard_queue.publish("llc", [2, 3])
+    first = shard_queue.lease("a")
+
+    clock.now += distributed.LEASE_TIMEOUT + 1
+    assert shard_queue.lease("b") == first
+
+
+def test_old_owner_cannot_renew_complete_or_release(shard_queue, clock):
+    shard_queue.publish("llc", [2, 3])
+    range_id, _, _ = shard_queue.lease("a")
+    clock.now += distributed.LEASE_TIMEOUT + 1
+    assert shard_queue.lease("b")[0] == range_id
+
+    published = []
+    assert not shard_queue.renew(range_id, "a")
+    assert not shard_queue.complete(range_id, "a", publish=lambda: published.append("a"))
+    shard_queue.release(range_id, "a")
+    assert published == []
+    assert shard_queue.counts() == {"pending": 0, "leased": 1, "done": 0}
+
+    assert shard_queue.complete(range_id, "b", publish=lambda: published.append("b"))
+    assert published == ["b"]
+    assert shard_queue.done_ranges() == [(2, 3)]
+
+
+def test_failed_publish_leaves_the_range_leased(shard_queue, clock):
+    shard_queue.publish("llc", [2, 3])
+    range_id, _, _ = shard_queue.lease("a")
+
+    def publish():
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        shard_queue.complete(range_id, "a", publish=publish)
+    assert shard_queue.counts() == {"pending": 0, "leased": 1, "done": 0}
+
+    shard_queue.release(range_id, "a")
+    assert shard_queue.lease("b")[0] == range_id
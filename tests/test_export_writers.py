@@ -0,0 +1,106 @@
+import os
+import json
+import pytest
+import export_writers
+from data_exporter import DataExporter, FIELD_ORDER, normalize_results
+from export_writers import NdjsonWriter, make_writer, write_parallel
+
+API_RESULTS = [
+    {"businessName": "Apex Works LLC", "registrationId": "SD0000001", "status": "Active",
+     "filingDate": "2001-02-03", "agent": {"name": "Ana Smith", "address": None,
+                                           "email": "ana@example.com"}},
+    {"businessName": "Nova Labs LLC", "registrationId": "SD0000002", "status": None,
+     "filingDate": None, "agent": {"name": None, "address": "12 Oak St", "email": None}},
+    {"businessName": "Core Group INC", "registrationId": "SD0000003", "status": "Active",
+     "filingDate": "2010-11-12", "agent": {"name": "Ana Smith", "address": None,
+                                           "email": "ana@example.com"}},
+]
+
+
+ROWS = [tuple(r.get(f) for f in FIELD_ORDER) for r in normalize_results(API_RESULTS)]
+
+
+class BrokenWriter(NdjsonWriter):
+
+    def write_row(self, row):
+        raise RuntimeError("writer bug")
+
+
+@pytest.fixture
+def broken_format(monkeypatch):
+    monkeypatch.setitem(export_writers.WRITERS, "broken", BrokenWriter)
+    return "broken"
+
+
+def writers(tmp_path, broken_required):
+    base = str(tmp_path / "q")
+    return [
+        make_writer("json", base, FIELD_ORDER),
+        make_writer("csv", base, FIELD_ORDER),
+        make_writer("broken", base, FIELD_ORDER, required=broken_required),
+    ]
+
+
+def test_failed_optional_writer_keeps_the_others(tmp_path, broken_format):
+    failures = write_parallel(writers(tmp_path, broken_required=False), iter(ROWS))
+
+    assert [w.format for w in failures] == ["broken"]
+    assert sorted(os.listdir(tmp_path)) == ["q.csv", "q.json"]
+    with open(tmp_path / "q.json", encoding="utf-8") as f:
+        assert len(json.load(f)) == len(ROWS)
+
+
+def test_failed_required_writer_discards_every_output(tmp_path, broken_format):
+    with pytest.raises(RuntimeError, match="writer bug"):
+        write_parallel(writers(tmp_path, broken_required=True), iter(ROWS))
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_row_iteration_discards_every_output(tmp_path, broken_format):
+    def rows():
+        yield ROWS[0]
+        raise ValueError("store broke")
+
+    with pytest.raises(ValueError, match="store broke"):
+        write_parallel(writers(tmp_path, broken_required=False), rows())
+
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_exporter_saves_json_and_csv_when_a_format_fails(tmp_path, broken_format, streaming):
+    exporter = DataExporter("q", output_dir=str(tmp_path), streaming=streaming,
+                            formats=("broken",))
+    exporter.add_results(API_RESULTS)
+    exporter.save()
+
+    assert exporter.verify_integrity()
+    assert set(exporter.failed_formats) == {"broken"}
+    assert set(exporter.manifest["files"]) == {"json", "csv"} | ({"ndjson"} if streaming else set())
+    assert not os.path.exists(tmp_path / "q.broken")
+    assert not os.path.exists(tmp_path / "q.broken.part")
+
+
+def read_arrow(pa, path):
+    with pa.ipc.open_file(str(path)) as reader:
+        return reader.read_all()
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_null_fields_in_columnar_outputs(tmp_path, streaming):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    exporter = DataExporter("q", output_dir=str(tmp_path), streaming=streaming,
+                            formats=("parquet", "arrow"))
+    records = normalize_results(API_RESULTS)
+    exporter.add_records(records[:2])
+    exporter.add_records(records[2:])
+    exporter.save()
+
+    assert exporter.verify_integrity()
+    for table in (pq.read_table(tmp_path / "q.parquet"), read_arrow(pa, tmp_path / "q.arrow")):
+        assert table.to_pylist() == records
+        assert pa.types.is_dictionary(table.schema.field("agent_address").type)
+    with open(tmp_path / "q.json", encoding="utf-8") as f:
+        assert json.load(f) == records
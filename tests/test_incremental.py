@@ -0,0 +1,110 @@
+import json
+import pytest
+from incremental import detect_ordering, page_is_ordered
+from BusinessSearchScraper import BusinessSearchScraper
+
+
+def records(*ids, dates=None):
+    dates = dates or [""] * len(ids)
+    return [{"registration_id": i, "filing_date": d} for i, d in zip(ids, dates)]
+
+
+@pytest.mark.parametrize("page, ordering", [
+    (records("SD01", "SD02", "SD03"), "registration_id:asc"),
+    (records("SD03", "SD02", "SD01"), "registration_id:desc"),
+    (records("SD02", "SD01", "SD03", dates=["2001", "2002", "2003"]), "filing_date:asc"),
+    (records("SD02", "SD01", "SD03", dates=["2003", "2002", "2001"]), "filing_date:desc"),
+    (records("SD02", "SD01", "SD03", dates=["2002", "2001", "2003"]), None),
+    (records("SD01", None, "SD03"), None),   # a missing key can't be relied on
+    (records("SD01"), None),                 # one record shows no order
+    ([], None),
+])
+def test_detect_ordering(page, ordering):
+    assert detect_ordering(page) == ordering
+
+
+def test_equal_keys_count_as_ordered():
+    assert detect_ordering(records("SD01", "SD01", "SD02")) == "registration_id:asc"
+
+
+@pytest.mark.parametrize("page, ordering, edge, ordered", [
+    (records("SD04", "SD05"), "registration_id:asc", None, True),
+    (records("SD05", "SD04"), "registration_id:asc", None, False),
+    # Ascending orders are probed backwards: edge is the first record of
+    # the page probed before, which comes after this one.
+    (records("SD04", "SD05"), "registration_id:asc", "SD06", True),
+    (records("SD04", "SD05"), "registration_id:asc", "SD03", False),
+    # Descending orders are probed forwards: edge comes before this page.
+    (records("SD05", "SD04"), "registration_id:desc", "SD06", True),
+    (records("SD05", "SD04"), "registration_id:desc", "SD03", False),
+    (records("SD05", None), "registration_id:desc", None, False),
+    ([], "registration_id:asc", "SD03", True),
+])
+def test_page_is_ordered(page, ordering, edge, ordered):
+    assert page_is_ordered(page, ordering, edge) is ordered
+
+
+class FakeSessions:
+
+    def expect_pages(self, count):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeAPI:
+    # Serves pages of 10 ascending registration IDs from a dict.
+    max_concurrency = 3
+    cache = None
+    session_id = "session"
+
+    def __init__(self, names, ids):
+        self.pages = {}
+        for start in range(0, len(ids), 10):
+            self.pages[start // 10 + 1] = [
+                {"businessName": names.get(i, f"old {i}"), "registrationId": i,
+                 "status": "Active", "filingDate": "", "agent": {}}
+                for i in ids[start:start + 10]
+            ]
+
+    def fetch_page(self, query, page):
+        return {"results": self.pages.get(page, []), "totalPages": len(self.pages),
+                "totalResults": sum(len(p) for p in self.pages.values())}
+
+
+def scrape(tmp_path, api, incremental):
+    scraper = BusinessSearchScraper("q", api=api, sessions=FakeSessions(), solver=object(),
+                                    output_dir=str(tmp_path), incremental=incremental,
+                                    reuse_session=False)
+    scraper.run()
+    with open(tmp_path / "q.json", encoding="utf-8") as f:
+        return {r["registration_id"]: r["business_name"] for r in json.load(f)}
+
+
+def ids(first, last):
+    return [f"SD{i:04d}" for i in range(first, last + 1)]
+
+
+def test_incremental_scan_keeps_previous_records(tmp_path):
+    scrape(tmp_path, FakeAPI({}, ids(1, 30)), incremental=False)
+    names = {i: f"new {i}" for i in ids(1, 40)}
+
+    output = scrape(tmp_path, FakeAPI(names, ids(1, 40)), incremental=True)
+
+    assert sorted(output) == ids(1, 40)
+    # Page 2 sits between page 1 and the probed last pages.
+    assert output["SD0011"] == "old SD0011"
+    assert output["SD0040"] == "new SD0040"
+
+
+def test_fallback_replaces_previous_records(tmp_path):
+    scrape(tmp_path, FakeAPI({}, ids(1, 30)), incremental=False)
+    names = {i: f"new {i}" for i in ids(1, 30)}
+    # The last page breaks the ascending order, and SD0005 was deleted.
+    current = [i for i in ids(1, 20) if i != "SD0005"] + ids(21, 30)[::-1]
+
+    output = scrape(tmp_path, FakeAPI(names, current), incremental=True)
+
+    assert sorted(output) == sorted(current)
+    assert all(name.startswith("new") for name in output.values())
@@ -0,0 +1,61 @@
+import gzip
+import json
+import pytest
+import manifest
+from manifest import iter_json_array
+
+RECORDS = [
+    {"business_name": "Apex ] Works, LLC", "registration_id": "SD0000001"},
+    {"business_name": "[Nova] {Labs}", "registration_id": "SD0000002",
+     "agent_name": "say \"],[\" twice"},
+    {"business_name": "Ünïcode \\ back\\slash", "registration_id": "SD0000003"},
+    {"nested": {"list": [1, [2, "]"]], "empty": {}}, "registration_id": "SD0000004"},
+]
+
+
+def write(path, text, compression=None):
+    opener = gzip.open if compression == "gz" else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, 7, 16, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_objects_split_across_read_chunks(tmp_path, monkeypatch, chunk, indent):
+    monkeypatch.setattr(manifest, "READ_CHUNK", chunk)
+    path = write(tmp_path / "out.json", json.dumps(RECORDS, indent=indent, ensure_ascii=False))
+
+    assert list(iter_json_array(path)) == RECORDS
+
+
+@pytest.mark.parametrize("chunk", [1, 5])
+def test_gzip_input(tmp_path, monkeypatch, chunk):
+    monkeypatch.setattr(manifest, "READ_CHUNK", chunk)
+    path = write(tmp_path / "out.json.gz", json.dumps(RECORDS), compression="gz")
+
+    assert list(iter_json_array(path, "gz")) == RECORDS
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ \n ]\n", "[\n]"])
+def test_empty_array(tmp_path, monkeypatch, text):
+    monkeypatch.setattr(manifest, "READ_CHUNK", 1)
+
+    assert list(iter_json_array(write(tmp_path / "out.json", text))) == []
+
+
+@pytest.mark.parametrize("text", [
+    '[{"a": "]"}, {"b": 1}',   # no closing bracket
+    '[{"a": "x"',              # object cut off
+    '',
+])
+def test_truncated_array_raises(tmp_path, monkeypatch, text):
+    monkeypatch.setattr(manifest, "READ_CHUNK", 3)
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(write(tmp_path / "out.json", text)))
+
+
+def test_non_array_raises(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_json_array(write(tmp_path / "out.json", '{"a": 1}')))
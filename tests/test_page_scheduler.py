@@ -0,0 +1,170 @@
+import threading
+from api_client import SessionExpiredError
+from captcha_solver import CaptchaSolverError
+from page_scheduler import PageScheduler
+
+TIMEOUT = 5
+
+
+class FakeAPI:
+    max_concurrency = 3
+
+    def __init__(self):
+        self.session_id = "session-0"
+
+
+class FakeSessions:
+
+    def __init__(self, api, fail=False):
+        self.api = api
+        self.fail = fail
+        self.renewals = []
+
+    def expect_pages(self, count):
+        pass
+
+    def renew(self, expired_session):
+        self.renewals.append(expired_session)
+        if self.fail:
+            raise CaptchaSolverError("solve failed")
+        self.api.session_id = f"session-{len(self.renewals)}"
+
+
+class FakeScraper:
+    # Pages return [page] once their gate is opened; expire maps a page to
+    # how many times it answers 403 first.
+
+    query = "fake"
+
+    def __init__(self, api, pages, expire=None, gated=False):
+        self.api = api
+        self.gates = {page: threading.Event() for page in pages}
+        if not gated:
+            for gate in self.gates.values():
+                gate.set()
+        self.expire = dict(expire or {})
+        self.started = []
+        self.finished = []
+        self.collected = []
+        self._lock = threading.Lock()
+
+    def _fetch_and_collect(self, page):
+        session_id = self.api.session_id
+        with self._lock:
+            self.started.append(page)
+        assert self.gates[page].wait(TIMEOUT)
+        with self._lock:
+            if self.expire.get(page, 0) > 0:
+                self.expire[page] -= 1
+                raise SessionExpiredError("Session expired (403)", session_id)
+            self.finished.append(page)
+        return page, [page]
+
+    def _collect(self, page, records):
+        self.collected.append(page)
+
+
+def wait_until(condition):
+    event = threading.Event()
+    for _ in range(TIMEOUT * 100):
+        if condition():
+            return
+        event.wait(0.01)
+    raise AssertionError("condition not reached")
+
+
+def run_in_thread(scheduler, jobs):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(failed=scheduler.run(jobs)))
+    thread.start()
+    return thread, result
+
+
+def test_pages_are_collected_in_order_when_they_finish_out_of_order():
+    api = FakeAPI()
+    scraper = FakeScraper(api, [1, 2, 3], gated=True)
+    scheduler = PageScheduler(api, FakeSessions(api))
+    thread, result = run_in_thread(scheduler, [(scraper, p) for p in (1, 2, 3)])
+
+    wait_until(lambda: len(scraper.started) == 3)
+    for page in (3, 2, 1):
+        scraper.gates[page].set()
+        wait_until(lambda: page in scraper.finished)
+        if page != 1:
+            assert scraper.collected == []
+    thread.join(TIMEOUT)
+
+    assert scraper.finished == [3, 2, 1]
+    assert scraper.collected == [1, 2, 3]
+    assert result["failed"] == []
+
+
+def test_slow_page_holds_dispatch_to_the_window():
+    api = FakeAPI()
+    pages = list(range(1, 21))
+    scraper = FakeScraper(api, pages)
+    scraper.gates[1].clear()
+    scheduler = PageScheduler(api, FakeSessions(api), window=5)
+    thread, result = run_in_thread(scheduler, [(scraper, p) for p in pages])
+
+    wait_until(lambda: len(scraper.finished) == 4)
+    assert max(scraper.started) == 5
+    assert scraper.collected == []
+
+    scraper.gates[1].set()
+    thread.join(TIMEOUT)
+    assert scraper.collected == pages
+    assert result["failed"] == []
+
+
+def test_pages_in_flight_on_an_expired_session_are_requeued():
+    api = FakeAPI()
+    pages = list(range(1, 8))
+    scraper = FakeScraper(api, pages, expire={3: 1, 5: 1})
+    sessions = FakeSessions(api)
+
+    failed = PageScheduler(api, sessions).run([(scraper, p) for p in pages])
+
+    assert failed == []
+    assert scraper.collected == pages
+    assert sessions.renewals[0] == "session-0"
+    assert api.session_id != "session-0"
+
+
+def test_failed_renewal_abandons_the_undispatched_pages():
+    api = FakeAPI()
+    pages = list(range(1, 11))
+    scraper = FakeScraper(api, pages, expire={p: 1 for p in pages[1:]}, gated=True)
+    sessions = FakeSessions(api, fail=True)
+    thread, result = run_in_thread(PageScheduler(api, sessions), [(scraper, p) for p in pages])
+
+    # Page 2 expires and renewal fails while pages 1 and 3 are still in
+    # flight; page 3 then expires too but is not requeued or renewed again.
+    wait_until(lambda: len(scraper.started) == 3)
+    scraper.gates[2].set()
+    wait_until(lambda: sessions.renewals)
+    for page in pages:
+        scraper.gates[page].set()
+    thread.join(TIMEOUT)
+
+    assert sessions.renewals == ["session-0"]
+    assert scraper.collected == [1]
+    assert sorted(page for _, page in result["failed"]) == pages[1:]
+    assert sorted(scraper.started) == [1, 2, 3]
+
+
+def test_page_errors_are_reported_without_blocking_later_pages():
+    api = FakeAPI()
+    scraper = FakeScraper(api, [1, 2, 3])
+
+    def fetch(page):
+        if page == 2:
+            raise ValueError("bad page")
+        return page, [page]
+
+    scraper._fetch_and_collect = fetch
+    failed = PageScheduler(api, FakeSessions(api)).run([(scraper, p) for p in (1, 2, 3)])
+
+    assert failed == [(scraper, 2)]
+    assert scraper.collected == [1, 3]
+
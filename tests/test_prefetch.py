@@ -0,0 +1,53 @@
+import threading
+from BusinessSearchScraper import BusinessSearchScraper
+
+
+class FakeSessions:
+
+    def expect_pages(self, count):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeAPI:
+    # Like the live API, answers pages past the end with an error.
+    max_concurrency = 3
+    cache = None
+    session_id = "session"
+
+    def __init__(self, total_pages, failing=()):
+        self.total_pages = total_pages
+        self.failing = set(failing)
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def fetch_page(self, query, page):
+        with self._lock:
+            self.requested.append(page)
+        if page > self.total_pages or page in self.failing:
+            raise Exception("Unexpected HTTP 400: Invalid page")
+        results = [{"businessName": f"Business {page}", "registrationId": f"SD{page:04d}"}]
+        return {"results": results, "totalPages": self.total_pages,
+                "totalResults": self.total_pages}
+
+
+def scrape(tmp_path, api):
+    scraper = BusinessSearchScraper("q", api=api, sessions=FakeSessions(), solver=object(),
+                                    output_dir=str(tmp_path), reuse_session=False)
+    return scraper.run()
+
+
+def test_pages_past_the_end_are_not_reported(tmp_path, capsys):
+    assert scrape(tmp_path, FakeAPI(1)) == 1
+    assert "Prefetch" not in capsys.readouterr().out
+
+
+def test_failed_prefetch_within_range_is_reported_and_refetched(tmp_path, capsys):
+    api = FakeAPI(3, failing={2})
+    scrape(tmp_path, api)
+
+    assert "Prefetch of 'q' page 2 failed" in capsys.readouterr().out
+    assert sorted(api.requested) == [1, 2, 2, 3]
+
@@ -0,0 +1,88 @@
+import time
+import types
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import pytest
+import rate_limiter
+from rate_limiter import RateLimiter, parse_retry_after
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Replaces the limiter's clock; sleeping just advances it.
+    now = [1000.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    fake = types.SimpleNamespace(monotonic=lambda: now[0], time=time.time, sleep=sleep)
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return now
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("5", 5.0),
+    ("0.5", 0.5),
+    ("0", 0.0),
+    ("-3", 0.0),     # never a negative wait
+    ("", None),
+    (None, None),
+    ("soon", None),
+])
+def test_parse_retry_after_seconds(value, seconds):
+    assert parse_retry_after(value) == seconds
+
+
+def test_parse_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    assert parse_retry_after(format_datetime(when, usegmt=True)) == pytest.approx(30, abs=2)
+
+
+def test_parse_retry_after_past_date():
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_success_increases_rate_additively(clock):
+    limiter = RateLimiter(rate=1.0, max_rate=1.25)
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(1.0 + rate_limiter.INCREASE_STEP)
+
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == 1.25
+
+
+def test_backoff_halves_once_per_cooldown(clock):
+    limiter = RateLimiter(rate=8.0)
+    limiter.on_backoff()
+    limiter.on_backoff()
+    assert limiter.rate == 4.0
+
+    clock[0] += rate_limiter.DECREASE_COOLDOWN
+    limiter.on_backoff()
+    assert limiter.rate == 2.0
+
+
+def test_backoff_stops_at_min_rate(clock):
+    limiter = RateLimiter(rate=0.3, min_rate=0.2)
+    for _ in range(3):
+        limiter.on_backoff()
+        clock[0] += rate_limiter.DECREASE_COOLDOWN
+
+    assert limiter.rate == 0.2
+
+
+def test_tokens_queue_callers_at_the_rate(clock):
+    limiter = RateLimiter(rate=2.0, burst=1)
+
+    assert [limiter._reserve() for _ in range(3)] == [0.0, 0.5, 1.0]
+
+
+def test_retry_after_blocks_acquire(clock):
+    limiter = RateLimiter(rate=10.0)
+    limiter.on_backoff(retry_after=3.0)
+
+    assert limiter.acquire() == 3.0
+    # The retry-after window has passed; only the halved rate applies.
+    assert limiter.acquire() == pytest.approx(0.0)
@@ -0,0 +1,129 @@
+import json
+import types
+import pytest
+import response_cache
+from api_client import APIClient
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache, CACHE_NAME
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / CACHE_NAME), ttl=60)
+    yield cache
+    cache.close()
+
+
+def test_entries_go_stale_after_ttl(cache, clock):
+    cache.put("k", b"body", etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    clock[0] += 59
+    entry = cache.get("k")
+    assert entry == (b"body", '"v1"', "Mon, 01 Jan 2024 00:00:00 GMT", True)
+
+    clock[0] += 1
+    assert cache.get("k").fresh is False
+
+
+def test_refresh_restarts_ttl(cache, clock):
+    cache.put("k", b"body", etag='"v1"')
+    clock[0] += 120
+    cache.refresh("k")
+
+    assert cache.get("k") == (b"body", '"v1"', None, True)
+
+
+def test_missing_key(cache):
+    assert cache.get("k") is None
+
+
+def test_put_replaces_entry(cache):
+    cache.put("k", b"old", etag='"v1"')
+    cache.put("k", b"new", etag='"v2"')
+
+    assert cache.get("k").body == b"new"
+    assert cache._size == len(response_cache.zlib.compress(b"new",
+                                                           response_cache.COMPRESSION_LEVEL))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    body = bytes(range(256)) * 4   # incompressible enough to count
+    size = len(response_cache.zlib.compress(body, response_cache.COMPRESSION_LEVEL))
+    cache = ResponseCache(str(tmp_path / CACHE_NAME), max_bytes=size * 2)
+    for key in ("a", "b"):
+        cache.put(key, body)
+        clock[0] += 1
+    cache.get("a")   # "b" is now the least recently used
+    clock[0] += 1
+
+    cache.put("c", body)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache._size == size * 2
+    cache.close()
+
+
+def test_size_survives_reopen(tmp_path, clock):
+    path = str(tmp_path / CACHE_NAME)
+    cache = ResponseCache(path)
+    cache.put("a", b"x" * 1000)
+    size = cache._size
+    cache.close()
+
+    cache = ResponseCache(path)
+    assert cache._size == size
+    cache.close()
+
+
+class FakeHTTP:
+    # Answers with ETag "v1" and honours If-None-Match; records each request.
+
+    def __init__(self, body):
+        self.body = body
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.requests.append(dict(headers))
+        if headers.get("if-none-match") == '"v1"':
+            return types.SimpleNamespace(status_code=304, content=b"", headers={}, text="")
+        return types.SimpleNamespace(status_code=200, content=self.body,
+                                     headers={"etag": '"v1"'}, text="")
+
+
+def make_api(cache, body):
+    api = APIClient(cache=cache, rate_limiter=RateLimiter(rate=1000, burst=1000))
+    api.http = FakeHTTP(body)
+    api.use_session("session", store=False)
+    return api
+
+
+def test_fresh_entry_is_served_without_a_request(cache):
+    body = json.dumps({"results": [{"registrationId": "SD01"}]}).encode()
+    api = make_api(cache, body)
+
+    first = api.fetch_page("q", 1)
+    second = api.fetch_page("q", 1)
+
+    assert first == second == {"results": [{"registrationId": "SD01"}]}
+    assert len(api.http.requests) == 1
+
+
+def test_stale_entry_is_revalidated_with_its_etag(cache, clock):
+    body = json.dumps({"results": []}).encode()
+    api = make_api(cache, body)
+    api.fetch_page("q", 1)
+    clock[0] += 61
+
+    assert api.fetch_page("q", 1) == {"results": []}
+    assert api.http.requests[1]["if-none-match"] == '"v1"'
+    # The 304 made the entry fresh again.
+    assert cache.get(cache.key(api.api_url, "q", 1)).fresh
+    api.fetch_page("q", 1)
+    assert len(api.http.requests) == 2
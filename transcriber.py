@@ -0,0 +1,179 @@
+import os
+import json
+import math
+import queue
+import zipfile
+import threading
+import subprocess
+import urllib.request
+
+VOSK_MODEL_URL = "https://alphacephei.com/vosk/models/vosk-model-small-en-us-0.15.zip"
+VOSK_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vosk-model")
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 8000  # bytes of s16le PCM fed to the recognizer per call
+MAX_ALTERNATIVES = 5
+# Digit challenges are re-decoded with the vocabulary limited to these words.
+DIGIT_WORDS = ["zero", "oh", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine"]
+DIGIT_GRAMMAR = json.dumps(DIGIT_WORDS + ["[unk]"])
+
+_model = None
+_model_lock = threading.Lock()
+_transcriber = None
+_transcriber_lock = threading.Lock()
+
+
+def ensure_vosk_model(model_path=VOSK_MODEL_DIR):
+    if os.path.exists(model_path):
+        return model_path
+    print("[CAPTCHA] Downloading Vosk speech model (~50 MB)...")
+    zip_path = model_path + ".zip"
+    urllib.request.urlretrieve(VOSK_MODEL_URL, zip_path)
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        extracted_name = zf.namelist()[0].split('/')[0]
+        zf.extractall(os.path.dirname(model_path))
+    extracted_path = os.path.join(os.path.dirname(model_path), extracted_name)
+    if extracted_path != model_path:
+        os.rename(extracted_path, model_path)
+    os.remove(zip_path)
+    print("[CAPTCHA] Vosk model ready.")
+    return model_path
+
+
+def get_model():
+    # The model is loaded once per process and shared by every solver and
+    # thread; Vosk models are read-only once loaded.
+    global _model
+    with _model_lock:
+        if _model is None:
+            from vosk import Model
+            _model = Model(ensure_vosk_model())
+        return _model
+
+
+def get_transcriber():
+    global _transcriber
+    with _transcriber_lock:
+        if _transcriber is None:
+            _transcriber = Transcriber(get_model())
+        return _transcriber
+
+
+def is_digit_phrase(text):
+    words = text.split()
+    return bool(words) and all(word in DIGIT_WORDS for word in words)
+
+
+def normalize_alternatives(alternatives):
+    # Vosk scores alternatives on an unnormalized log scale; a softmax turns
+    # them into probabilities that sum to 1 over the n-best list.
+    scores = {}
+    for alternative in alternatives:
+        text = alternative.get("text", "").strip()
+        score = alternative.get("confidence", 0.0)
+        scores.setdefault(text, []).append(score)
+    if not scores:
+        return []
+    top = max(max(values) for values in scores.values())
+    weights = {
+        text: sum(math.exp(score - top) for score in values)
+        for text, values in scores.items()
+    }
+    total = sum(weights.values())
+    return sorted(
+        ((text, weight / total) for text, weight in weights.items()),
+        key=lambda hypothesis: hypothesis[1], reverse=True,
+    )
+
+
+class Transcriber:
+
+    def __init__(self, model):
+        self.model = model
+        self._recognizers = {}
+
+    def _acquire_recognizer(self, grammar=None):
+        pool = self._recognizers.setdefault(grammar, queue.LifoQueue())
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            from vosk import KaldiRecognizer
+
+            if grammar:
+                rec = KaldiRecognizer(self.model, SAMPLE_RATE, grammar)
+            else:
+                rec = KaldiRecognizer(self.model, SAMPLE_RATE)
+            rec.SetMaxAlternatives(MAX_ALTERNATIVES)
+            rec.SetWords(True)
+            return rec
+
+    def _release_recognizer(self, rec, grammar=None):
+        rec.Reset()
+        self._recognizers[grammar].put(rec)
+
+    def _final_hypotheses(self, rec):
+        final = json.loads(rec.FinalResult())
+        return normalize_alternatives(final.get("alternatives", [final]))
+
+    def _redecode(self, pcm, grammar):
+        rec = self._acquire_recognizer(grammar)
+        try:
+            for offset in range(0, len(pcm), CHUNK_SIZE):
+                rec.AcceptWaveform(pcm[offset:offset + CHUNK_SIZE])
+            return self._final_hypotheses(rec)
+        finally:
+            self._release_recognizer(rec, grammar)
+
+    def _feed_ffmpeg(self, proc, audio_bytes):
+        try:
+            proc.stdin.write(audio_bytes)
+        except BrokenPipeError:
+            pass
+        finally:
+            proc.stdin.close()
+
+    def transcribe(self, audio_bytes):
+        hypotheses = self.transcribe_nbest(audio_bytes)
+        return hypotheses[0][0] if hypotheses else ""
+
+    def transcribe_nbest(self, audio_bytes):
+        # Returns [(text, probability)], best first. MP3 goes into ffmpeg on
+        # stdin and raw PCM comes back on stdout, feeding the recognizer as it
+        # is decoded; nothing touches the disk.
+        proc = subprocess.Popen(
+            [
+                "ffmpeg", "-i", "pipe:0",
+                "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1",
+                "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        writer = threading.Thread(
+            target=self._feed_ffmpeg, args=(proc, audio_bytes), daemon=True
+        )
+        writer.start()
+
+        rec = self._acquire_recognizer()
+        pcm = bytearray()
+        try:
+            while True:
+                data = proc.stdout.read(CHUNK_SIZE)
+                if not data:
+                    break
+                pcm += data
+                rec.AcceptWaveform(data)
+            writer.join()
+            if proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, "ffmpeg")
+
+            hypotheses = self._final_hypotheses(rec)
+        finally:
+            proc.stdout.close()
+            self._release_recognizer(rec)
+
+        # The open vocabulary confuses digits with similar-sounding words, so
+        # digit challenges are decoded again from the same PCM with a grammar.
+        if hypotheses and is_digit_phrase(hypotheses[0][0]):
+            hypotheses = self._redecode(bytes(pcm), DIGIT_GRAMMAR) or hypotheses
+        return hypotheses